@@ -9,6 +9,7 @@ import re
 import glob
 import shutil
 import sys
+import numpy as np
 from PIL import Image
 from make_wav import (
     compress_dynamic_range,
@@ -18,6 +19,15 @@ from make_wav import (
     convert_to_unsigned_pcm_wav,
 )
 import agonutils as au
+from interleave import interleave_frames
+from temporal_dither import DitherStabilizer
+from frame_diff import open_frames, diff_frames, changed_counts, changed_bbox, crop_frame
+from rle2_stats import rle2_token_stats
+from letterbox import detect_letterbox, crop_filter, center_crop_box, display_aspect
+from agon_wav import build_agon_wav_header, read_agon_wav_data
+from scene_cuts import SceneCutDetector, detect_scene_cuts_file, second_activity, allocate_video_budgets
+from audio_dsp import can_decode, resample_to_u8_wav
+from adpcm import encode_adpcm_units, adpcm_report, audio_bytes_per_sec
 
 # ------------------- Unit Header Mask Definitions -------------------
 AGM_UNIT_TYPE       = 0b10000000  # Bit 7: 1 = video; 0 = audio
@@ -26,6 +36,13 @@ AGM_UNIT_CMP_RAW    = 0b00000000  # No compression
 AGM_UNIT_CMP_SZIP   = 0b00001000  # SZIP compression
 AGM_UNIT_CMP_TVC    = 0b00010000  # TVC TurboVega Compression 
 AGM_UNIT_CMP_SRLE2  = 0b00011000  # SRLE2 compression (RLE2 + SZIP)
+AGM_UNIT_KIND       = 0b01100000  # Bits 5-6: video unit kind, one of the following
+AGM_UNIT_FRAME      = 0b00000000  # One full frame
+AGM_UNIT_BUCKET     = 0b00100000  # All of a segment's frames, byte-interleaved
+AGM_UNIT_REPEAT     = 0b01000000  # No data (empty chunk list); keep showing the current frame
+AGM_UNIT_RECT       = 0b01100000  # Dirty rectangle: 8-byte <HHHH x,y,w,h, then the compressed sub-image
+AGM_AUDIO_CMP_PCM   = 0b00000000  # Audio units, bits 3-4: raw 8-bit unsigned PCM
+AGM_AUDIO_CMP_ADPCM = 0b00001000  # Audio units, bits 3-4: 4-bit IMA ADPCM (see adpcm.py)
 
 # --------------------------------------------------------------------
 
@@ -81,17 +98,16 @@ def compress_frame_data(frame_bytes, frame_idx, total_frames, compression_type):
     Returns:
       bytes: The compressed frame data.
     """
+    # Handle "raw" case (no compression)
+    if compression_type == "raw":
+        return bytes(frame_bytes)
+
     # Create a temporary file for the raw data.
     temp_raw_path = create_temp_file()
     try:
         with open(temp_raw_path, "wb") as temp_raw:
             temp_raw.write(frame_bytes)
 
-        # Handle "raw" case (no compression)
-        if compression_type == "raw":
-            with open(temp_raw_path, "rb") as f_in:
-                return f_in.read()
-
         # Create output file path for the final compressed data.
         temp_compressed_path = create_temp_file()
 
@@ -128,6 +144,35 @@ def compress_frame_data(frame_bytes, frame_idx, total_frames, compression_type):
 
     return compressed_bytes
 
+def write_unit_chunks(seg_buffer, unit_bytes, chunksize):
+    """
+    Write a unit's payload as a series of (4-byte size, data) chunks,
+    terminated by a zero-length chunk.
+    """
+    off = 0
+    while off < len(unit_bytes):
+        chunk = unit_bytes[off: off + chunksize]
+        off += len(chunk)
+        seg_buffer.write(struct.pack("<I", len(chunk)))
+        seg_buffer.write(chunk)
+    seg_buffer.write(struct.pack("<I", 0))
+
+def unit_container_size(payload_size, chunksize):
+    """Bytes a unit takes in a segment: mask byte, chunk sizes, payload and zero terminator."""
+    return 1 + 4 * -(-payload_size // chunksize) + payload_size + 4
+
+def is_repeat_frame(last_frame_bytes, frame_bytes, repeat_threshold):
+    """
+    True if frame_bytes can be replaced by a repeat unit: identical to the last
+    emitted frame (repeat_threshold == 0) or differing in at most repeat_threshold pixels.
+    """
+    if last_frame_bytes is None or repeat_threshold is None:
+        return False
+    if repeat_threshold == 0:
+        return last_frame_bytes == frame_bytes
+    changed = changed_counts(np.frombuffer(frame_bytes, dtype=np.uint8), reference=last_frame_bytes)[0]
+    return changed <= repeat_threshold
+
 def make_agm(
     frames_file,
     target_audio_path,
@@ -137,7 +182,13 @@ def make_agm(
     frame_rate,
     target_sample_rate,
     chunksize,
-    compression_type
+    compression_type,
+    unit_layout="frame",
+    repeat_threshold=None,
+    dirty_rect_max_fraction=None,
+    scene_cuts=None,
+    video_budgets=None,
+    audio_codec="pcm"
 ):
     """
     Creates an AGM file with the specified compression type.
@@ -147,15 +198,45 @@ def make_agm(
       - 68-byte AGM header.
       - For each 1-second segment:
           - 8-byte segment header (previous segment size, current segment size).
-          - For each frame in the segment: a video unit consisting of a 1-byte mask
-            and the compressed frame data (written in chunks).
+          - unit_layout "frame": for each frame in the segment, a video unit consisting
+            of a 1-byte mask and the compressed frame data (written in chunks).
+          - unit_layout "bucket": a single video unit (mask has AGM_UNIT_BUCKET set) whose
+            data is all of the segment's frames byte-interleaved, then compressed as one block.
           - One audio unit: a 1-byte mask followed by the audio data for that second (written in chunks).
+
+    Duplicate-frame elision (frame layout only): if repeat_threshold is not None, a frame
+    that matches the last emitted frame exactly (0) or within repeat_threshold changed
+    pixels is written as a repeat unit: AGM_UNIT_TYPE | AGM_UNIT_REPEAT and an empty
+    chunk list, telling the player to keep the current frame. Near-duplicates are always
+    compared with the last frame actually emitted, so small changes cannot accumulate.
+    The bytes saved per repeat are estimated as the size of the last compressed frame.
+
+    Dirty rectangles (frame layout only): if dirty_rect_max_fraction is not None, the
+    bounding box of pixels changed since the last emitted frame is computed. If it covers
+    at most that fraction of the frame, an AGM_UNIT_RECT unit is written instead of a full
+    frame: the box as 4 little-endian 16-bit values (x, y, w, h), followed by only that
+    sub-image compressed with the normal codec. An unchanged frame becomes a repeat unit.
+
+    Scene cuts: scene_cuts is an optional list of frame indices (see scene_cuts.py). A cut
+    frame is a keyframe: it is always written as a full frame unit, never as a repeat or
+    a rectangle. Cuts per second are written to the CSV, and so are the per-second
+    budgets from video_budgets if given, with seconds over budget counted at the end.
+
+    Audio codec: "pcm" writes each second as raw 8-bit samples (mask AGM_AUDIO_CMP_PCM).
+    "adpcm" writes 4-bit IMA ADPCM units (mask AGM_AUDIO_CMP_ADPCM; adpcm.py has the
+    layout and the reference decoder), encoded for all seconds in one vectorized pass.
+    It roughly halves the audio bytes; adpcm_report prints what that returns to video.
+    The audio bytes of each second go to the CSV.
     """
-    WAV_HEADER_SIZE = 76
     AGM_HEADER_SIZE = 68
     agm_header_fmt = "<6sBHHBII48x"
 
-    AUDIO_MASK = 0x00  # Audio unit mask (bit7=0)
+    if audio_codec == "pcm":
+        AUDIO_MASK = AGM_AUDIO_CMP_PCM  # Audio unit mask (bit7=0)
+    elif audio_codec == "adpcm":
+        AUDIO_MASK = AGM_AUDIO_CMP_ADPCM
+    else:
+        raise ValueError(f"Unknown audio codec: {audio_codec}")
 
     # Determine the correct compression mask for video units.
     if compression_type == "tvc":
@@ -169,6 +250,9 @@ def make_agm(
     else:
         raise ValueError(f"Unknown compression type: {compression_type}")
 
+    if unit_layout not in ("frame", "bucket"):
+        raise ValueError(f"Unknown unit layout: {unit_layout}")
+
     # Note: The video unit header must always have the video type bit set.
     video_mask = AGM_UNIT_TYPE | compression_mask
 
@@ -177,17 +261,19 @@ def make_agm(
         raise RuntimeError(f"Frames file not found: {frames_file}")
     with open(frames_file, "rb") as f:
         frames_data = f.read()
+    frames_view = memoryview(frames_data)
     frame_size = target_width * target_height
     total_frames = len(frames_data) // frame_size
     print("-------------------------------------------------")
     print(f"make_agm: Found {total_frames} frames in {frames_file}")
 
-    # 2) Read and fix audio header.
-    with open(target_audio_path, "rb") as wf:
-        wav_header = wf.read(WAV_HEADER_SIZE)
-        # Insert "agm" marker at offset 12..14.
-        wav_header = wav_header[:12] + b"agm" + wav_header[15:]
-        audio_data = wf.read()
+    # 2) Read the audio samples wherever ffmpeg put them and write a canonical header.
+    audio_sample_rate, audio_data = read_agon_wav_data(target_audio_path)
+    if audio_sample_rate != target_sample_rate:
+        raise ValueError(f"{target_audio_path} is {audio_sample_rate} Hz, expected {target_sample_rate} Hz")
+    wav_header = build_agon_wav_header(target_sample_rate, len(audio_data))
+    # Insert "agm" marker at offset 12..14.
+    wav_header = wav_header[:12] + b"agm" + wav_header[15:]
 
     audio_data_size = len(audio_data)
     audio_secs_float = audio_data_size / float(target_sample_rate)
@@ -200,6 +286,12 @@ def make_agm(
         f"Merging {total_frames} frames total."
     )
 
+    # ADPCM: every second is an independent unit, so encode them all at once.
+    adpcm_units = None
+    if audio_codec == "adpcm":
+        padded_audio = audio_data[:total_secs * target_sample_rate].ljust(total_secs * target_sample_rate, b"\x80")
+        adpcm_units = encode_adpcm_units(padded_audio, target_sample_rate)
+
     # 4) Create AGM header.
     version = 1
     agm_header = struct.pack(
@@ -223,6 +315,17 @@ def make_agm(
     print(f"Writing CSV data to: {csv_filename}")
 
     aggregated_video_bytes = [0] * total_secs
+    repeat_frames = [0] * total_secs
+    repeat_bytes_saved = [0] * total_secs
+    rect_frames = [0] * total_secs
+    audio_bytes = [0] * total_secs
+    cut_frames = set(scene_cuts or [])
+    cuts_per_sec = [0] * total_secs
+    for cut in cut_frames:
+        if cut < total_frames:
+            cuts_per_sec[cut // frame_rate] += 1
+    last_frame_bytes = None
+    last_compressed_size = 0
     samples_per_sec = target_sample_rate
     frames_per_segment = frame_rate
 
@@ -233,7 +336,7 @@ def make_agm(
     with open(target_agm_path, "wb") as agm_file, open(csv_filename, "w") as csv_file:
         csv_file.write("frame_size,frame_rate,audio_rate\n")
         csv_file.write(f"{target_width * target_height},{frame_rate},{target_sample_rate}\n")
-        csv_file.write("time_sec,compressed_video_bytes\n")
+        csv_file.write("time_sec,compressed_video_bytes,repeat_frames,repeat_bytes_saved,rect_frames,scene_cuts,video_budget,audio_bytes\n")
 
         # Write WAV and AGM headers.
         agm_file.write(wav_header)
@@ -243,49 +346,85 @@ def make_agm(
             seg_buffer = BytesIO()
 
             # ---------------- VIDEO UNITS (multiple per segment) ----------------
-            for i in range(frames_per_segment):
-                if frame_index >= total_frames:
-                    break
-
-                start = frame_index * frame_size
-                end = start + frame_size
-                frame_bytes = frames_data[start:end]
-
-                # Write video unit header (must be video unit; bit 7 set)
-                seg_buffer.write(struct.pack("<B", video_mask))
-
-                # Compress the frame using the chosen method.
-                compressed_frame_bytes = compress_frame_data(
-                    frame_bytes, frame_index, total_frames, compression_type
-                )
-
-                # Write the compressed video data in chunks.
-                off = 0
-                while off < len(compressed_frame_bytes):
-                    chunk = compressed_frame_bytes[off: off + chunksize]
-                    off += len(chunk)
-                    seg_buffer.write(struct.pack("<I", len(chunk)))
-                    seg_buffer.write(chunk)
-                # Terminate the video unit.
-                seg_buffer.write(struct.pack("<I", 0))
-
-                aggregated_video_bytes[segment_idx] += len(compressed_frame_bytes)
-                frame_index += 1
+            if unit_layout == "bucket":
+                # One unit for the whole segment: interleave its frames, compress once.
+                bucket_frames = []
+                bucket_first = frame_index
+                while len(bucket_frames) < frames_per_segment and frame_index < total_frames:
+                    start = frame_index * frame_size
+                    bucket_frames.append(frames_view[start:start + frame_size])
+                    frame_index += 1
+
+                if bucket_frames:
+                    seg_buffer.write(struct.pack("<B", video_mask | AGM_UNIT_BUCKET))
+                    compressed_bucket_bytes = compress_frame_data(
+                        interleave_frames(bucket_frames), bucket_first, total_frames, compression_type
+                    )
+                    write_unit_chunks(seg_buffer, compressed_bucket_bytes, chunksize)
+                    aggregated_video_bytes[segment_idx] += len(compressed_bucket_bytes)
+            else:
+                for i in range(frames_per_segment):
+                    if frame_index >= total_frames:
+                        break
+
+                    start = frame_index * frame_size
+                    end = start + frame_size
+                    frame_bytes = frames_data[start:end]
+
+                    # A scene cut is a keyframe: always a full frame, never relative to the last one.
+                    if frame_index in cut_frames:
+                        last_frame_bytes = None
+
+                    # Dirty rectangle of changes since the last emitted frame (None if unchanged).
+                    use_rect = dirty_rect_max_fraction is not None and last_frame_bytes is not None
+                    box = changed_bbox(last_frame_bytes, frame_bytes, target_width, target_height) if use_rect else None
+
+                    # Duplicate (or near-duplicate) of the last emitted frame: zero-payload repeat unit.
+                    if is_repeat_frame(last_frame_bytes, frame_bytes, repeat_threshold) or (use_rect and box is None):
+                        seg_buffer.write(struct.pack("<B", AGM_UNIT_TYPE | AGM_UNIT_REPEAT))
+                        write_unit_chunks(seg_buffer, b"", chunksize)
+                        repeat_frames[segment_idx] += 1
+                        repeat_bytes_saved[segment_idx] += last_compressed_size
+                        frame_index += 1
+                        continue
+
+                    if box is not None and box[2] * box[3] <= dirty_rect_max_fraction * frame_size:
+                        # Only the changed sub-image, prefixed with its geometry.
+                        seg_buffer.write(struct.pack("<B", video_mask | AGM_UNIT_RECT))
+                        compressed_frame_bytes = struct.pack("<HHHH", *box) + compress_frame_data(
+                            crop_frame(frame_bytes, target_width, target_height, box),
+                            frame_index, total_frames, compression_type
+                        )
+                        rect_frames[segment_idx] += 1
+                    else:
+                        # Write video unit header (must be video unit; bit 7 set)
+                        seg_buffer.write(struct.pack("<B", video_mask))
+
+                        # Compress the frame using the chosen method.
+                        compressed_frame_bytes = compress_frame_data(
+                            frame_bytes, frame_index, total_frames, compression_type
+                        )
+
+                    # Write the compressed video data in chunks.
+                    write_unit_chunks(seg_buffer, compressed_frame_bytes, chunksize)
+
+                    aggregated_video_bytes[segment_idx] += len(compressed_frame_bytes)
+                    last_frame_bytes = frame_bytes
+                    last_compressed_size = len(compressed_frame_bytes)
+                    frame_index += 1
 
             # ---------------- AUDIO UNIT (once per segment) ----------------
             seg_buffer.write(struct.pack("<B", AUDIO_MASK))
-            start_aud = segment_idx * samples_per_sec
-            end_aud = start_aud + samples_per_sec
-            unit_audio = audio_data[start_aud:end_aud]
-            if len(unit_audio) < samples_per_sec:
-                unit_audio += b"\x00" * (samples_per_sec - len(unit_audio))
-            offset = 0
-            while offset < len(unit_audio):
-                chunk = unit_audio[offset: offset + chunksize]
-                offset += len(chunk)
-                seg_buffer.write(struct.pack("<I", len(chunk)))
-                seg_buffer.write(chunk)
-            seg_buffer.write(struct.pack("<I", 0))
+            if adpcm_units is not None:
+                unit_audio = adpcm_units[segment_idx]
+            else:
+                start_aud = segment_idx * samples_per_sec
+                end_aud = start_aud + samples_per_sec
+                unit_audio = audio_data[start_aud:end_aud]
+                if len(unit_audio) < samples_per_sec:
+                    unit_audio += b"\x00" * (samples_per_sec - len(unit_audio))
+            write_unit_chunks(seg_buffer, unit_audio, chunksize)
+            audio_bytes[segment_idx] = len(unit_audio)
 
             # ---------------- SEGMENT HEADER ----------------
             segment_data = seg_buffer.getvalue()
@@ -296,9 +435,21 @@ def make_agm(
 
         # Write CSV rows aggregated by second.
         for sec in range(total_secs):
-            csv_file.write(f"{sec},{aggregated_video_bytes[sec]}\n")
+            budget = video_budgets[sec] if video_budgets is not None and sec < len(video_budgets) else ""
+            csv_file.write(f"{sec},{aggregated_video_bytes[sec]},{repeat_frames[sec]},{repeat_bytes_saved[sec]},{rect_frames[sec]},{cuts_per_sec[sec]},{budget},{audio_bytes[sec]}\n")
 
     print("AGM file creation complete.\n")
+    if repeat_threshold is not None:
+        total_repeats = sum(repeat_frames)
+        print(f"Repeat units: {total_repeats} frames ({total_repeats / float(frame_rate):.1f}s), "
+              f"~{sum(repeat_bytes_saved)} bytes saved")
+    if scene_cuts is not None:
+        print(f"Scene cuts: {sum(cuts_per_sec)} keyframes")
+    if video_budgets is not None:
+        over = [sec for sec in range(min(total_secs, len(video_budgets))) if aggregated_video_bytes[sec] > video_budgets[sec]]
+        print(f"Video budget: {len(over)} of {total_secs} seconds over budget")
+    if adpcm_units is not None:
+        adpcm_report(audio_data, target_sample_rate, adpcm_units)
     print(f"CSV data written to: {csv_filename}")
 
 
@@ -422,6 +573,13 @@ def convert_audio(staged_audio_path, target_audio_path):
     # 1) Get metadata from the trimmed audio.
     _, codec = get_audio_metadata(trimmed_audio_path)
 
+    # 2+3) In process when soundfile can read it: resample and quantize in one streamed pass.
+    if can_decode(trimmed_audio_path):
+        resample_to_u8_wav(trimmed_audio_path, target_audio_path, target_sample_rate, audio_dither)
+        print(f"Finished audio processing: {target_audio_path}")
+        print("")
+        return
+
     # 2) Resample the trimmed audio.
     shutil.copy(trimmed_audio_path, temp_path)
     resample_wav(temp_path, target_audio_path, target_sample_rate, codec)
@@ -440,11 +598,12 @@ def convert_audio(staged_audio_path, target_audio_path):
 # 1. Process Frames
 # -------------------------------------------------------------------
 
-def extract_and_process_frames(staged_video_path, seek_time, duration, frame_rate):
+def extract_and_process_frames(staged_video_path, seek_time, duration, frame_rate, crop_box=None):
     """
     Extract frames from the video (using ffmpeg) and process each frame:
-      - Optionally remove letterboxing.
-      - Resize to target dimensions.
+      - Optionally remove letterboxing: crop_box (x, y, w, h) is applied in the ffmpeg
+        filter graph; see content_crop_box.
+      - Resize to target dimensions (which should have the box's display aspect).
       - Convert to the custom palette.
       - Convert to RGBA2 format.
     The resulting RGBA2 data from all frames is concatenated into a single .frames file 
@@ -452,11 +611,23 @@ def extract_and_process_frames(staged_video_path, seek_time, duration, frame_rat
     video_base_name and palette_conversion_method) but placed in staging_directory.
     
     Intermediate .png files are created temporarily and then deleted.
+
+    If do_stabilize_dither is set, each frame is instead quantized in memory twice
+    (no_dither_method and palette_conversion_method) and passed through a
+    DitherStabilizer so static areas keep last frame's dither pattern (reset at
+    scene cuts found on the undithered frames). The plain
+    dithered frames are also kept in a second .frames file so
+    report_dither_stabilisation can compare compressed sizes per second.
     """
     # Clear out any existing files in the frames_directory.
     for f in glob.glob(os.path.join(frames_directory, "*")):
         os.remove(f)
     
+    # Crop inside ffmpeg, once for the whole clip.
+    video_filter = f"fps={frame_rate}"
+    if crop_box is not None:
+        video_filter = f"{crop_filter(crop_box)},{video_filter}"
+
     # Extract frames as PNG images in frames_directory.
     output_pattern = os.path.join(frames_directory, "frame_%05d.png")
     print("-------------------------------------------------")
@@ -469,7 +640,7 @@ def extract_and_process_frames(staged_video_path, seek_time, duration, frame_rat
             "-i", staged_video_path,
             "-t", str(duration),
 
-            "-vf", f"fps={frame_rate}",
+            "-vf", video_filter,
             # "-vf", f"tblend=all_mode=lighten,tmix=frames=3:weights='1 2 1',fps={frame_rate}",
             # "-vf", f"tblend=all_mode=lighten,tmix=frames=2:weights='1 1',fps={frame_rate}",
             # "-vf", f"mpdecimate,removegrain=4,tmedian=3,fps={frame_rate}",
@@ -499,6 +670,11 @@ def extract_and_process_frames(staged_video_path, seek_time, duration, frame_rat
     filenames = sorted([f for f in os.listdir(frames_directory) if f.endswith('.png')])
     total_frames = len(filenames)
     
+    plain_frames_path = output_frames_path.replace(".frames", "_unstabilised.frames")
+    stabilizer = DitherStabilizer(dither_lookback) if do_stabilize_dither else None
+    cut_detector = SceneCutDetector(max(1, frame_rate // 2)) if do_stabilize_dither else None
+    plain_file = open(plain_frames_path, "wb") if do_stabilize_dither else None
+
     with open(output_frames_path, "wb") as out_file:
         print(f"Processing {total_frames} frames and writing to {output_frames_path}")
         for i, pngfile in enumerate(filenames, start=1):
@@ -506,12 +682,21 @@ def extract_and_process_frames(staged_video_path, seek_time, duration, frame_rat
             # Load the extracted frame.
             content_img = Image.open(pngpath)
             
-            # Remove letterbox if enabled.
-            if do_remove_letterbox:
-                content_img = remove_letterbox(content_img)
-            
             # Resize directly to the target dimensions.
             final_img = content_img.resize((target_width, target_height), Image.LANCZOS)
+
+            if stabilizer is not None:
+                # Quantize in memory both ways and keep the dither pattern stable.
+                no_dither = quantize_to_rgba2(final_img, no_dither_method)
+                dithered = quantize_to_rgba2(final_img, palette_conversion_method)
+                # New scene: nothing of the previous dither pattern is worth keeping.
+                if cut_detector.process(no_dither):
+                    stabilizer.reset()
+                out_file.write(stabilizer.process(no_dither, dithered))
+                plain_file.write(dithered)
+                print(f"\r\033[KFrame {i}/{total_frames} processed: {pngfile}", end="", flush=True)
+                os.remove(pngpath)
+                continue
             
             # Save the processed image to a temporary .png file.
             temp_png_path = os.path.join(staging_directory, "temp_frame.png")
@@ -542,23 +727,75 @@ def extract_and_process_frames(staged_video_path, seek_time, duration, frame_rat
             os.remove(temp_rgba2_path)
             os.remove(pngpath)
     
+    if plain_file is not None:
+        plain_file.close()
     print(f"\nAll frames processed and combined into {output_frames_path}.")
 
 
-def remove_letterbox(img):
-    width, height = img.size
-    # Compute desired aspect ratio (width / height)
-    desired_aspect = target_width / target_height
-    # Calculate the new height using the full width
-    new_height = int(width / desired_aspect)
-    
-    # If the computed new height exceeds the image height, return the original
-    if new_height > height:
-        return img
+def quantize_to_rgba2(img, method):
+    """Convert a PIL image to the custom palette with 'method' and pack it as RGBA2, in memory."""
+    rgba = img.convert("RGBA")
+    width, height = rgba.size
+    converted = au.convert_to_palette_bytes(
+        rgba.tobytes(), width, height, palette_filepath, method, transparent_rgb
+    )
+    return au.rgba32_to_rgba2_bytes(converted, width, height)
 
-    top = (height - new_height) // 2
-    bottom = top + new_height
-    return img.crop((0, top, width, bottom))
+
+def report_dither_stabilisation(stabilised_path, plain_path, frame_size, frame_rate, compression_type, csv_path):
+    """
+    Compare compressed bytes per second with and without dither stabilisation.
+
+    Columns: time_sec, then for plain and stabilised frames the size with the AGM codec
+    (each frame compressed as make_agm would) and the RLE2 size of the diffed frames
+    (predicted by rle2_stats, no recompression needed).
+    """
+    plain = open_frames(plain_path, frame_size)
+    stabilised = open_frames(stabilised_path, frame_size)
+    total_frames = min(plain.shape[0], stabilised.shape[0])
+    total_secs = int(math.ceil(total_frames / float(frame_rate)))
+
+    rows = []
+    for sec in range(total_secs):
+        start = sec * frame_rate
+        end = min(start + frame_rate, total_frames)
+        row = [sec]
+        for frames in (plain, stabilised):
+            block = np.asarray(frames[start:end])
+            codec_bytes = sum(
+                len(compress_frame_data(block[i].tobytes(), start + i, total_frames, compression_type))
+                for i in range(len(block))
+            )
+            reference = frames[start - 1] if start > 0 else None
+            diff_bytes = sum(a["comp_size"] for a in rle2_token_stats(diff_frames(block, reference)))
+            row += [codec_bytes, diff_bytes]
+        rows.append(row)
+
+    with open(csv_path, "w") as csv_file:
+        csv_file.write("time_sec,plain_bytes,plain_diff_rle2_bytes,stabilised_bytes,stabilised_diff_rle2_bytes\n")
+        for row in rows:
+            csv_file.write(",".join(str(v) for v in row) + "\n")
+
+    plain_total = sum(r[1] for r in rows)
+    stab_total = sum(r[3] for r in rows)
+    print("")
+    print(f"Dither stabilisation: {plain_total} -> {stab_total} bytes "
+          f"({stab_total / float(total_secs or 1):.0f} B/s with, {plain_total / float(total_secs or 1):.0f} B/s without)")
+    print(f"Stabilisation report written to: {csv_path}")
+
+
+def content_crop_box(staged_video_path, seek_time, duration):
+    """
+    The crop box (x, y, w, h) for the clip, or None for the whole frame: the bars
+    detected in the source (do_detect_letterbox), else a centered crop to
+    letterbox_aspect (do_remove_letterbox).
+    """
+    crop_box = None
+    if do_detect_letterbox:
+        crop_box = detect_letterbox(staged_video_path, seek_time, duration)
+    if crop_box is None and do_remove_letterbox:
+        crop_box = center_crop_box(staged_video_path, letterbox_aspect)
+    return crop_box
 
 def delete_frames():
     print("-------------------------------------------------")
@@ -581,29 +818,77 @@ if __name__ == "__main__":
     transparent_rgb = (0, 0, 0, 0)
     bytes_per_sec = 57600  # 60*960
     target_sample_rate = 15360  # 16*960 
+    audio_dither = False  # TPDF dither when quantizing to 8 bits (in-process audio path only)
+    audio_codec = "pcm"  # "pcm" = raw 8-bit units; "adpcm" = 4-bit IMA ADPCM units (about half the bytes)
     chunksize = bytes_per_sec // 60
 
     youtube_url = "https://youtu.be/3yWrXPck6SI"
     video_base_name = f'Star_Wars__Battle_of_Yavin'
     seek_time = "00:01:25"
     do_remove_letterbox = True
+    do_detect_letterbox = True  # Detect the bars from the source; falls back to do_remove_letterbox if none found
+    letterbox_aspect = 2.35  # Display aspect do_remove_letterbox crops to
     
     duration  = 120
     frame_rate    = 10
+    unit_layout   = 'frame'  # 'frame' = one video unit per frame; 'bucket' = one interleaved unit per second
+    repeat_threshold = None  # None = off; 0 = elide exact duplicates; N = elide frames with <= N changed pixels
+    dirty_rect_max_fraction = None  # None = off; else send only the changed box when it covers <= this fraction
 
     palette_conversion_method = 'bayer'
     compression_type = 'srle2'
     target_width  = 240
 
+    # Temporal dither stabilisation: reuse last frame's dither where the undithered frame is unchanged.
+    do_stabilize_dither = False
+    no_dither_method = 'RGB'
+    dither_lookback = 5
+
+    # Scene cuts: keyframes at cuts and per-second video budgets lent from quiet to busy seconds.
+    do_detect_scene_cuts = True
+    video_bytes_per_sec = bytes_per_sec - audio_bytes_per_sec(target_sample_rate, audio_codec)
+
     # palette_conversion_method = 'bayer'
     # compression_type = 'tvc'
     # target_width  = 144
 
-    target_height = int(target_width / 2.35)
+    staged_video_path = os.path.join(staging_directory, f"{video_base_name}.mp4")
+
+    # Frame height follows the cropped picture's display aspect (SAR and rotation included).
+    crop_box = content_crop_box(staged_video_path, seek_time, duration)
+    content_aspect = display_aspect(staged_video_path, crop_box)
+
+    # Settings planner: measure real compressed bytes/sec on a sample of the source and
+    # take width, frame rate, dither method, codec and audio rate from the Pareto front.
+    do_plan_settings = False
+    if do_plan_settings:
+        from agm_planner import plan_agm_settings, choose_plan
+        front, _ = plan_agm_settings(
+            staged_video_path, seek_time, bytes_per_sec,
+            widths=[160, 192, 240, 288, 320],
+            frame_rates=[6, 8, 10, 12, 15],
+            methods=[palette_conversion_method],
+            codecs=["srle2", "tvc", "szip"],
+            palette_filepath=palette_filepath,
+            transparent_rgb=transparent_rgb,
+            aspect=content_aspect,
+            crop_box=crop_box,
+            chunksize=chunksize,
+            audio_codec=audio_codec,
+        )
+        plan = choose_plan(front, min_audio_rate=target_sample_rate)
+        if plan is not None:
+            target_width = plan["width"]
+            frame_rate = plan["fps"]
+            compression_type = plan["codec"]
+            target_sample_rate = plan["audio_rate"]
+            video_bytes_per_sec = bytes_per_sec - audio_bytes_per_sec(target_sample_rate, audio_codec)
+            print(f"Planned: {target_width} wide @ {frame_rate} fps, {compression_type}, audio {target_sample_rate} Hz")
+
+    target_height = int(target_width / content_aspect)
     target_height = (target_height + 2) & ~2
 
     video_target_name = f'{video_base_name}'
-    staged_video_path = os.path.join(staging_directory, f"{video_base_name}.mp4")
     staged_audio_path = os.path.join(staging_directory, f"{video_base_name}.wav")
     target_audio_path = os.path.join(target_directory, f"{video_target_name}.wav")
     target_agm_path = os.path.join(target_directory, f"{video_target_name}_{compression_type}_{palette_conversion_method}_{frame_rate:02d}_{target_width}.agm")
@@ -615,8 +900,20 @@ if __name__ == "__main__":
     # preprocess_audio(staged_audio_path)
     convert_audio(staged_audio_path, target_audio_path)
 
-    extract_and_process_frames(staged_video_path, seek_time, duration, frame_rate)
+    extract_and_process_frames(staged_video_path, seek_time, duration, frame_rate, crop_box)
+    if do_stabilize_dither:
+        report_dither_stabilisation(
+            output_frames_path,
+            output_frames_path.replace(".frames", "_unstabilised.frames"),
+            target_width * target_height, frame_rate, compression_type,
+            os.path.join(staging_directory, f"{video_base_name}_{palette_conversion_method}_stabilisation.csv")
+        )
+
+    scene_cuts, video_budgets = None, None
+    if do_detect_scene_cuts:
+        scene_cuts, changed = detect_scene_cuts_file(output_frames_path, target_width * target_height, frame_rate)
+        video_budgets = allocate_video_budgets(second_activity(changed, scene_cuts, frame_rate), video_bytes_per_sec)
 
-    make_agm(output_frames_path, target_audio_path, target_agm_path, target_width, target_height, frame_rate, target_sample_rate, chunksize, compression_type)
+    make_agm(output_frames_path, target_audio_path, target_agm_path, target_width, target_height, frame_rate, target_sample_rate, chunksize, compression_type, unit_layout, repeat_threshold, dirty_rect_max_fraction, scene_cuts, video_budgets, audio_codec)
     
     # delete_frames()
\ No newline at end of file
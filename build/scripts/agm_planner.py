@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Grid-search planner for AGM encoding settings.
+
+Instead of sizing video as if it were uncompressed (pick_audio_sample_rate), a few
+seconds of the real source are decoded at every candidate (width, fps), quantized
+with every candidate dither method and compressed with every candidate codec, exactly
+as agm_make would. Each (width, fps, method) is one job on a process pool. The
+measured peak compressed bytes/sec then decides the audio rate: the largest multiple
+of 60 that still fits the byte budget together with the container around the data:
+each unit's mask byte, chunk sizes and terminator, and the segment header. Candidates
+that fit are reduced to the Pareto front over (pixels, fps, audio rate), separately
+for each dither method.
+
+The sample is cropped and sized as agm_make will do it: pass its crop box and
+the box's display aspect (letterbox.display_aspect).
+"""
+import subprocess
+import concurrent.futures
+import numpy as np
+import agonutils as au
+from agm_make import compress_frame_data, unit_container_size
+from compute_sample_rate_from_resolution import fit_audio_rate
+from adpcm import audio_bytes_per_sec, max_sample_rate
+from letterbox import crop_filter, detect_letterbox, display_aspect
+
+SEGMENT_HEADER_SIZE = 8  # last and this segment size
+
+def height_for_width(width, aspect):
+    """Frame height for a width, rounded as agm_make's __main__ does."""
+    return (int(width / aspect) + 2) & ~2
+
+def sample_rgba_frames(video_path, seek_time, sample_secs, width, height, fps, crop_box=None):
+    """
+    Decode sample_secs seconds of the source at fps, cropped (optional) and scaled to
+    width x height, through one ffmpeg rawvideo pipe. Returns a list of RGBA32 frames.
+    """
+    video_filter = f"fps={fps},scale={width}:{height}:flags=lanczos"
+    if crop_box is not None:
+        video_filter = f"{crop_filter(crop_box)},{video_filter}"
+    command = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-ss", str(seek_time),
+        "-i", video_path,
+        "-t", str(sample_secs),
+        "-vf", video_filter,
+        "-f", "rawvideo",
+        "-pix_fmt", "rgba",
+        "pipe:1",
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    frame_size = width * height * 4
+    return [result.stdout[i:i + frame_size] for i in range(0, len(result.stdout) - frame_size + 1, frame_size)]
+
+def measure_candidate(video_path, seek_time, sample_secs, width, height, fps, method, codecs,
+                      palette_filepath, transparent_rgb, crop_box=None, chunksize=960):
+    """
+    Worker: encode the sample at one (width, fps, method) with every codec.
+    Returns one dict per codec with mean and peak compressed video bytes/sec, and
+    peak_unit_bps: the peak with each frame's unit mask, chunk sizes and terminator.
+    """
+    rgba_frames = sample_rgba_frames(video_path, seek_time, sample_secs, width, height, fps, crop_box)
+    rgba2_frames = [
+        au.rgba32_to_rgba2_bytes(
+            au.convert_to_palette_bytes(frame, width, height, palette_filepath, method, transparent_rgb),
+            width, height
+        )
+        for frame in rgba_frames
+    ]
+    results = []
+    for codec in codecs:
+        sizes = np.array([
+            len(compress_frame_data(frame, i, len(rgba2_frames), codec))
+            for i, frame in enumerate(rgba2_frames)
+        ])
+        per_sec = np.bincount(np.arange(len(sizes)) // fps, weights=sizes)
+        unit_sizes = [unit_container_size(int(size), chunksize) for size in sizes]
+        unit_per_sec = np.bincount(np.arange(len(sizes)) // fps, weights=unit_sizes)
+        results.append({
+            "width": width,
+            "height": height,
+            "fps": fps,
+            "method": method,
+            "codec": codec,
+            "mean_bps": float(per_sec.mean()) if len(per_sec) else 0.0,
+            "peak_bps": int(per_sec.max()) if len(per_sec) else 0,
+            "peak_unit_bps": int(unit_per_sec.max()) if len(unit_per_sec) else 0,
+        })
+    return results
+
+def fit_plans(measurements, max_bps, chunksize=960, desired_rate=None, audio_codec="pcm"):
+    """
+    Attach the audio rate each measured candidate leaves room for (fit on peak
+    bytes/sec, a multiple of 60) and drop the candidates that do not fit at all.
+    The budget covers the whole segment: video units as measured (peak_unit_bps),
+    the audio unit in audio_codec with its mask, chunk sizes and terminator, and the
+    segment header. total_bps is that segment size.
+    """
+    def segment_bps(video_bps, audio_rate):
+        return video_bps + unit_container_size(audio_bytes_per_sec(audio_rate, audio_codec), chunksize)
+
+    plans = []
+    for m in measurements:
+        video_bps = m["peak_unit_bps"] + SEGMENT_HEADER_SIZE
+        try:
+            audio_bytes = fit_audio_rate(video_bps + unit_container_size(0, chunksize), max_bps)
+        except ValueError:
+            continue
+        # fit_audio_rate counts audio bytes, not samples or chunk sizes: convert, then
+        # step down until the whole unit fits.
+        audio_rate = max_sample_rate(audio_bytes, audio_codec) // 60 * 60
+        if desired_rate is not None:
+            audio_rate = min(audio_rate, max(int(round(desired_rate / 60.0)) * 60, 0))
+        while audio_rate >= 60 and segment_bps(video_bps, audio_rate) > max_bps:
+            audio_rate -= 60
+        if audio_rate < 60:
+            continue
+        plans.append(dict(m, audio_rate=audio_rate, total_bps=segment_bps(video_bps, audio_rate)))
+    return plans
+
+def pareto_front(plans):
+    """
+    Plans not dominated on (pixels, fps, audio_rate) by another plan with the same
+    dither method. For equal objectives the plan with the lowest peak bytes/sec is kept.
+    """
+    def objectives(p):
+        return (p["width"] * p["height"], p["fps"], p["audio_rate"])
+
+    best = {}
+    for p in plans:
+        key = (p["method"], objectives(p))
+        if key not in best or p["peak_bps"] < best[key]["peak_bps"]:
+            best[key] = p
+    unique = list(best.values())
+
+    front = []
+    for p in unique:
+        op = objectives(p)
+        if not any(
+            q["method"] == p["method"] and objectives(q) != op and all(a >= b for a, b in zip(objectives(q), op))
+            for q in unique
+        ):
+            front.append(p)
+    return sorted(front, key=lambda p: (p["method"], -p["width"] * p["height"] * p["fps"], -p["audio_rate"]))
+
+def choose_plan(front, method=None, min_audio_rate=0):
+    """Pick the plan with the most pixels per second (then audio) from a front."""
+    candidates = [p for p in front if (method is None or p["method"] == method) and p["audio_rate"] >= min_audio_rate]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda p: (p["width"] * p["height"] * p["fps"], p["audio_rate"]))
+
+def plan_agm_settings(video_path, seek_time, max_bps, widths, frame_rates, methods, codecs,
+                      palette_filepath, transparent_rgb, aspect=2.35, sample_secs=5,
+                      crop_box=None, desired_rate=None, jobs=None, chunksize=960, audio_codec="pcm"):
+    """
+    Run the grid search and return (front, plans): the Pareto-optimal plans and every
+    plan that fit the budget. Each plan is a dict with width, height, fps, method,
+    codec, mean_bps, peak_bps, peak_unit_bps, audio_rate, total_bps.
+    crop_box and aspect should be the ones agm_make uses, chunksize its unit chunk size
+    and audio_codec its audio codec ("pcm" or "adpcm", which fits about twice the rate).
+    """
+    grid = [(w, f, m) for w in widths for f in frame_rates for m in methods]
+    measurements = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(
+                measure_candidate, video_path, seek_time, sample_secs, w, height_for_width(w, aspect), f, m,
+                codecs, palette_filepath, transparent_rgb, crop_box, chunksize
+            )
+            for w, f, m in grid
+        ]
+        for n, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            measurements.extend(future.result())
+            print(f"\r\033[KPlanner: measured {n} of {len(grid)} candidates", end="", flush=True)
+    print("")
+
+    plans = fit_plans(measurements, max_bps, chunksize, desired_rate, audio_codec)
+    front = pareto_front(plans)
+    print(f"Planner: {len(plans)} of {len(measurements)} settings fit {max_bps} B/s, {len(front)} on the Pareto front")
+    for p in front:
+        print(f"  {p['width']}x{p['height']} @ {p['fps']} fps, {p['method']}/{p['codec']}: "
+              f"video {p['peak_bps']} B/s peak ({p['mean_bps']:.0f} mean), audio {p['audio_rate']} Hz, "
+              f"{p['total_bps']} B/s with container")
+    return front, plans
+
+if __name__ == "__main__":
+    video_path = "/home/smith/Agon/mystuff/assets/video/staging/Star_Wars__Battle_of_Yavin.mp4"
+    palette_filepath = "/home/smith/Agon/mystuff/assets/images/palettes/Agon64.gpl"
+    transparent_rgb = (0, 0, 0, 0)
+    max_bps = 57600  # 60*960
+    seek_time = "00:01:25"
+
+    # Crop as agm_make does by default: the detected bars, if any.
+    crop_box = detect_letterbox(video_path, seek_time, 120)
+    front, plans = plan_agm_settings(
+        video_path, seek_time, max_bps,
+        widths=[160, 192, 240, 288, 320],
+        frame_rates=[6, 8, 10, 12, 15],
+        methods=["bayer", "floyd", "RGB"],
+        codecs=["srle2", "tvc", "szip"],
+        palette_filepath=palette_filepath,
+        transparent_rgb=transparent_rgb,
+        aspect=display_aspect(video_path, crop_box),
+        crop_box=crop_box,
+        chunksize=max_bps // 60,
+    )
+    best = choose_plan(front, min_audio_rate=15360)
+    if best is not None:
+        print(f"Best: {best}")
@@ -9,6 +9,9 @@ import concurrent.futures
 import time
 
 import agonutils as au  # for rgba2_to_img, etc.
+from interleave import deinterleave_frames
+from frame_diff import paste_frame
+from adpcm import decode_adpcm_unit
 
 WAV_HEADER_SIZE = 76
 AGM_HEADER_SIZE = 68
@@ -23,6 +26,13 @@ COMP_SRLE2  = 3
 AGM_UNIT_TYPE      = 0b10000000  # Bit 7: video unit if set; audio unit otherwise
 AGM_UNIT_CMP_SRLE2 = 0b00011000  # Bits 3-4: SRLE2 compression (should equal 3)
 AGM_UNIT_CMP_TVC   = 0b00010000  # Bit 4: TurboVega compression (bit 4 set)
+AGM_UNIT_KIND      = 0b01100000  # Bits 5-6: video unit kind, one of the following
+AGM_UNIT_FRAME     = 0b00000000  # One full frame
+AGM_UNIT_BUCKET    = 0b00100000  # A whole segment's frames, byte-interleaved
+AGM_UNIT_REPEAT    = 0b01000000  # No data; keep showing the current frame
+AGM_UNIT_RECT      = 0b01100000  # Dirty rectangle: 8-byte <HHHH x,y,w,h then the compressed sub-image
+AGM_RECT_HDR_SIZE  = 8
+AGM_AUDIO_CMP_ADPCM = 0b00001000  # Audio unit, bits 3-4: 4-bit IMA ADPCM (see adpcm.py)
 VIDEO_MASK = AGM_UNIT_TYPE | AGM_UNIT_CMP_SRLE2
 
 def parse_agm_header(header_bytes):
@@ -158,7 +168,18 @@ def read_next_segment(f):
         return None
     return seg_data
 
-def process_segment(segment_data, width, height, fps):
+def decompress_video_data(unit_data, comp_type):
+    """Decompress a video unit's payload according to its compression bits."""
+    if comp_type == COMP_NONE:
+        return unit_data
+    elif comp_type == COMP_TVC:
+        return decompress_tvc_to_ram(unit_data)
+    elif comp_type == COMP_SRLE2:
+        return decompress_srle2_to_ram(unit_data)
+    print("Unsupported video compression type.")
+    return b""
+
+def process_segment(segment_data, width, height, fps, prev_frame=None):
     """
     Process one segment by reading all unit headers and their associated chunk data.
     A segment may contain multiple video units (each with its own unit header and chunks)
@@ -167,9 +188,15 @@ def process_segment(segment_data, width, height, fps):
     For each unit:
       - Read 1 byte header.
       - Read chunks (each chunk: 4-byte size then chunk data) until a zero-length chunk.
-      - For video units (header with bit 7 set), decompress if needed and extract a frame.
-      - For audio units (header with bit 7 clear), accumulate the audio data.
+      - For video units (header with bit 7 set), decompress if needed and extract a frame
+        (or, for interleaved bucket units, all of the segment's frames).
+      - For audio units (header with bit 7 clear), accumulate the audio data, decoding
+        ADPCM units (AGM_AUDIO_CMP_ADPCM) to 8-bit PCM.
     
+    A repeat unit (AGM_UNIT_REPEAT) carries no data and repeats the previous frame,
+    which may come from the previous segment (prev_frame). A dirty-rectangle unit
+    (AGM_UNIT_RECT) is pasted over the previous frame.
+
     Returns a tuple (video_frames, audio_data) where video_frames is a list of raw frames,
     and audio_data is the accumulated audio bytes for the segment.
     """
@@ -197,25 +224,39 @@ def process_segment(segment_data, width, height, fps):
             unit_data += seg_stream.read(chunk_size)
 
         # Process based on the unit type.
-        if unit_mask & 0x80:  # Video unit
-            if comp_type == COMP_NONE:
-                raw_video_data = unit_data
-            elif comp_type == COMP_TVC:
-                raw_video_data = decompress_tvc_to_ram(unit_data)
-            elif comp_type == COMP_SRLE2:
-                raw_video_data = decompress_srle2_to_ram(unit_data)
-            else:
-                print("Unsupported video compression type.")
-                raw_video_data = b""
-            frame_size = width * height
+        frame_size = width * height
+        unit_kind = unit_mask & AGM_UNIT_KIND
+        last = video_frames[-1] if video_frames else prev_frame
+        if last is None:
+            last = b"\x00" * frame_size
+        if unit_mask & 0x80 and unit_kind == AGM_UNIT_REPEAT:
+            # Repeat unit: show the last frame again.
+            video_frames.append(last)
+        elif unit_mask & 0x80 and unit_kind == AGM_UNIT_RECT:
+            # Dirty rectangle: composite the sub-image over the last frame.
+            x, y, w, h = struct.unpack("<HHHH", unit_data[:AGM_RECT_HDR_SIZE])
+            sub_image = decompress_video_data(unit_data[AGM_RECT_HDR_SIZE:], comp_type)
+            sub_image = sub_image[:w * h].ljust(w * h, b"\x00")
+            video_frames.append(paste_frame(last, width, height, (x, y, w, h), sub_image))
+        elif unit_mask & 0x80:  # Video unit
+            raw_video_data = decompress_video_data(unit_data, comp_type)
+            if unit_kind == AGM_UNIT_BUCKET:
+                # Interleaved bucket: split back into the segment's individual frames.
+                num_frames = len(raw_video_data) // frame_size
+                if num_frames:
+                    video_frames.extend(deinterleave_frames(raw_video_data[:num_frames * frame_size], num_frames))
+                continue
             # Ensure we have a full frame; pad if needed.
             if len(raw_video_data) < frame_size:
                 frame_data = raw_video_data + b"\x00" * (frame_size - len(raw_video_data))
             else:
                 frame_data = raw_video_data[:frame_size]
             video_frames.append(frame_data)
+        elif (unit_mask & AGM_UNIT_CMP_SRLE2) == AGM_AUDIO_CMP_ADPCM:
+            # ADPCM audio unit: decode back to 8-bit PCM.
+            audio_buffer += decode_adpcm_unit(unit_data)
         else:
-            # Audio unit (assumed uncompressed in AGM files)
+            # Raw 8-bit PCM audio unit
             audio_buffer += unit_data
 
     return video_frames, audio_buffer
@@ -257,11 +298,16 @@ def play_agm(filepath):
         # Create a ThreadPoolExecutor for pre-processing segments.
         executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
+        last_frame = [None]  # Last decoded frame, carried across segments for repeat units
+
         def read_and_process_next_segment():
             seg_data = read_next_segment(f)
             if seg_data is None:
                 return None
-            return process_segment(seg_data, width, height, fps)
+            result = process_segment(seg_data, width, height, fps, last_frame[0])
+            if result[0]:
+                last_frame[0] = result[0][-1]
+            return result
 
         # Prefetch the first segment.
         current_result = read_and_process_next_segment()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+The Agon 76-byte WAV header (see src/asm/agm.inc).
+
+The player reads exactly 76 bytes and starts streaming samples from offset 76:
+     0  RIFF, file size - 8, WAVE
+    12  fmt , 16, PCM (1), 1 channel, sample rate, byte rate, block align 1, 8 bits
+    36  LIST, 24, INFO, ISFT, 12, 12-byte software string (NUL padded)
+    68  data, data size
+    76  unsigned 8-bit mono samples
+ffmpeg's own headers depend on its version (the ISFT string length moves the data
+chunk) and may use WAVEFORMATEXTENSIBLE, so this module writes the canonical layout
+itself and validates/fixes files whatever their chunk order. Fixes are done with
+seek/write on the header alone whenever the samples already start at offset 76.
+"""
+import os
+import struct
+
+AGON_WAV_HEADER_SIZE = 76
+AGON_WAV_DATA_MARKER_OFFSET = 68
+AGON_WAV_ISFT = b"AgonJukebox"
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+COPY_BLOCK_SIZE = 1 << 20
+
+def build_agon_wav_header(sample_rate, data_size, software=AGON_WAV_ISFT):
+    """
+    The canonical 76-byte header for data_size bytes of 8-bit mono PCM
+    (the RIFF size counts the pad byte that follows an odd-sized data chunk).
+    """
+    isft = software[:11].ljust(12, b"\0")
+    header = b"".join([
+        b"RIFF", struct.pack("<I", AGON_WAV_HEADER_SIZE - 8 + data_size + (data_size & 1)), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, WAVE_FORMAT_PCM, 1, sample_rate, sample_rate, 1, 8),
+        b"LIST", struct.pack("<I", 24), b"INFO", b"ISFT", struct.pack("<I", len(isft)), isft,
+        b"data", struct.pack("<I", data_size),
+    ])
+    assert len(header) == AGON_WAV_HEADER_SIZE
+    return header
+
+class AgonWavWriter:
+    """
+    Streaming writer: writes a placeholder header, appends samples as they come and
+    patches the two size fields on close.
+
+        with AgonWavWriter(path, 15360) as w:
+            w.write(samples)
+    """
+    def __init__(self, path, sample_rate):
+        self.sample_rate = sample_rate
+        self.data_size = 0
+        self.file = open(path, "wb")
+        self.file.write(build_agon_wav_header(sample_rate, 0))
+
+    def write(self, samples):
+        self.file.write(samples)
+        self.data_size += len(samples)
+
+    def copy_from(self, src, offset, length):
+        """Append length bytes read from offset in the open file src."""
+        self.data_size += copy_range(src, self.file, offset, length)
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.data_size & 1:
+            self.file.write(b"\x80")  # RIFF chunks are word aligned; pad with silence
+        self.file.seek(0)
+        self.file.write(build_agon_wav_header(self.sample_rate, self.data_size))
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def read_wav_chunks(f):
+    """
+    Walk the RIFF chunks of an open file by seeking from header to header.
+    Returns a list of (chunk_id, data_offset, size); the data chunk's size is
+    clamped to what is actually in the file.
+    """
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    f.seek(0)
+    riff = f.read(12)
+    if len(riff) < 12 or riff[0:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+    chunks = []
+    offset = 12
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        chunk_id, size = struct.unpack("<4sI", f.read(8))
+        size = min(size, file_size - offset - 8)
+        chunks.append((chunk_id, offset + 8, size))
+        offset += 8 + size + (size & 1)
+    return chunks
+
+def validate_wav(path):
+    """
+    Inspect a WAV file without reading its samples. Returns a dict with
+    audio_format, channels, sample_rate, bits, data_offset, data_size,
+    is_agon_layout (header byte-for-byte canonical) and problems (why not playable).
+    """
+    with open(path, "rb") as f:
+        chunks = read_wav_chunks(f)
+        info = {"chunks": [c[0].decode("ascii", "replace") for c in chunks], "problems": []}
+        fmt = next((c for c in chunks if c[0] == b"fmt "), None)
+        data = next((c for c in chunks if c[0] == b"data"), None)
+        if fmt is None or data is None:
+            raise ValueError(f"{path}: missing {'fmt ' if fmt is None else 'data'} chunk")
+        f.seek(fmt[1])
+        fmt_bytes = f.read(fmt[2])
+        audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt_bytes[:16])
+        if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt_bytes) >= 26:
+            audio_format = struct.unpack("<H", fmt_bytes[24:26])[0]  # first 2 bytes of the SubFormat GUID
+        info.update(audio_format=audio_format, channels=channels, sample_rate=sample_rate, bits=bits,
+                    data_offset=data[1], data_size=data[2])
+        f.seek(0)
+        header = f.read(AGON_WAV_HEADER_SIZE)
+
+    if audio_format != WAVE_FORMAT_PCM:
+        info["problems"].append(f"audio format {audio_format}, not PCM")
+    if channels != 1:
+        info["problems"].append(f"{channels} channels, not mono")
+    if bits != 8:
+        info["problems"].append(f"{bits} bits per sample, not 8")
+    if data[1] != AGON_WAV_HEADER_SIZE:
+        info["problems"].append(f"samples start at {data[1]}, not {AGON_WAV_HEADER_SIZE}")
+    info["is_agon_layout"] = header[:AGON_WAV_DATA_MARKER_OFFSET] == \
+        build_agon_wav_header(sample_rate, data[2])[:AGON_WAV_DATA_MARKER_OFFSET] and not info["problems"]
+    return info
+
+def fix_agon_wav_header(path):
+    """
+    Give an 8-bit mono PCM WAV the canonical Agon header.
+      - Already canonical: nothing is written.
+      - Samples already at offset 76: the 76-byte header is rewritten in place.
+      - Otherwise the samples have to move: they are streamed block by block into a
+        new file next to the old one, which then replaces it.
+    Returns "ok", "patched" or "rewritten". Raises ValueError for formats the
+    player cannot play (not PCM, not mono, not 8-bit).
+    """
+    info = validate_wav(path)
+    format_problems = [p for p in info["problems"] if "samples start" not in p]
+    if format_problems:
+        raise ValueError(f"{path}: {', '.join(format_problems)}")
+    header = build_agon_wav_header(info["sample_rate"], info["data_size"])
+
+    if info["data_offset"] == AGON_WAV_HEADER_SIZE:
+        with open(path, "r+b") as f:
+            if f.read(AGON_WAV_HEADER_SIZE) == header:
+                return "ok"
+            f.seek(0)
+            f.write(header)
+        return "patched"
+
+    temp_path = path + ".tmp"
+    with open(path, "rb") as src, open(temp_path, "wb") as dst:
+        dst.write(header)
+        copy_range(src, dst, info["data_offset"], info["data_size"])
+        if info["data_size"] & 1:
+            dst.write(b"\x80")
+    os.replace(temp_path, path)
+    return "rewritten"
+
+def copy_range(src, dst, offset, length, block_size=COPY_BLOCK_SIZE):
+    """Copy length bytes from offset in src to the current position in dst, block by block."""
+    src.seek(offset)
+    remaining = length
+    while remaining > 0:
+        block = src.read(min(block_size, remaining))
+        if not block:
+            break
+        dst.write(block)
+        remaining -= len(block)
+    return length - remaining
+
+def concat_agon_wavs(track_paths, output_path, sample_rate=None, chunk_align=False):
+    """
+    Concatenate 8-bit mono PCM WAVs without re-encoding: the sample bytes of every
+    track are streamed into output_path behind one canonical header. All tracks must
+    share the sample rate (sample_rate, or the first track's if None).
+    With chunk_align, each track is padded with silence (0x80) to a multiple of
+    sample_rate / 60 bytes, so track boundaries fall on the player's 60-per-second
+    chunk reads. Returns the total number of sample bytes written.
+    """
+    infos = [validate_wav(path) for path in track_paths]
+    if sample_rate is None or sample_rate == -1:
+        sample_rate = infos[0]["sample_rate"]
+    for path, info in zip(track_paths, infos):
+        problems = [p for p in info["problems"] if "samples start" not in p]
+        if problems or info["sample_rate"] != sample_rate:
+            raise ValueError(f"{path}: cannot concatenate ({', '.join(problems) or str(info['sample_rate']) + ' Hz'})")
+    chunk_size = sample_rate // 60
+
+    with AgonWavWriter(output_path, sample_rate) as writer:
+        for path, info in zip(track_paths, infos):
+            with open(path, "rb") as src:
+                writer.copy_from(src, info["data_offset"], info["data_size"])
+            if chunk_align and chunk_size and writer.data_size % chunk_size:
+                writer.write(b"\x80" * (chunk_size - writer.data_size % chunk_size))
+    return writer.data_size
+
+def read_agon_wav_data(path):
+    """(sample_rate, sample bytes) of a playable WAV, whatever its header layout."""
+    info = validate_wav(path)
+    with open(path, "rb") as f:
+        f.seek(info["data_offset"])
+        return info["sample_rate"], f.read(info["data_size"])
+
+if __name__ == "__main__":
+    import sys
+    for wav_path in sys.argv[1:]:
+        wav_info = validate_wav(wav_path)
+        status = "Agon layout" if wav_info["is_agon_layout"] else "; ".join(wav_info["problems"]) or "non-canonical header"
+        print(f"{wav_path}: {wav_info['sample_rate']} Hz, {wav_info['data_size']} bytes, "
+              f"chunks {' '.join(wav_info['chunks'])}: {status}")
@@ -1,6 +1,69 @@
 #!/usr/bin/env python3
 import numpy as np
 
+AGZ_MAX_DICT = 4096  # Dictionary indices are 12 bits
+
+def pack_pixel_groups(data):
+    """
+    Pack every 4 pixels into a 24-bit integer (6 bits per pixel):
+    p0 in bits 18-23, p1 in bits 12-17, p2 in bits 6-11, p3 in bits 0-5.
+    'data' is a 1-D uint8 array whose length is a multiple of 4.
+    """
+    groups = (np.asarray(data, dtype=np.uint8) & 0x3F).reshape(-1, 4).astype(np.uint32)
+    return (groups[:, 0] << 18) | (groups[:, 1] << 12) | (groups[:, 2] << 6) | groups[:, 3]
+
+def unpack_groups_to_pixels(group_values):
+    """
+    Unpack 24-bit groups into 4 RGBA2 pixels each.
+    1) Force alpha (bits 7-6 = 11) => OR with 0xC0.
+    2) If == 0xF3 (pure magenta) => store 0x00 (fully transparent).
+    Returns bytes.
+    """
+    group_values = np.asarray(group_values, dtype=np.uint32)
+    shifts = np.array([18, 12, 6, 0], dtype=np.uint32)
+    pixels = (((group_values[:, np.newaxis] >> shifts) & 0x3F) | 0xC0).astype(np.uint8).reshape(-1)
+    pixels[pixels == 0xF3] = 0x00
+    return pixels.tobytes()
+
+def groups_to_bytes(group_values):
+    """Serialize 24-bit group values as 3 big-endian bytes each."""
+    g = np.asarray(group_values, dtype=np.uint32)
+    return np.stack([(g >> 16) & 0xFF, (g >> 8) & 0xFF, g & 0xFF], axis=1).astype(np.uint8).tobytes()
+
+def bytes_to_groups(data, count):
+    """Inverse of groups_to_bytes: read 'count' 24-bit big-endian values."""
+    b = np.frombuffer(data, dtype=np.uint8, count=count * 3).reshape(count, 3).astype(np.uint32)
+    return (b[:, 0] << 16) | (b[:, 1] << 8) | b[:, 2]
+
+def pack_indices_12(indices):
+    """
+    Pack 12-bit indices into a big-endian bit stream, two indices per 3 bytes.
+    An odd final index is padded with zero bits to complete its last byte.
+    """
+    idx = np.asarray(indices, dtype=np.uint16)
+    n = idx.size
+    if n % 2:
+        idx = np.append(idx, np.uint16(0))
+    pairs = idx.reshape(-1, 2)
+    out = np.empty((pairs.shape[0], 3), dtype=np.uint8)
+    out[:, 0] = pairs[:, 0] >> 4
+    out[:, 1] = ((pairs[:, 0] & 0xF) << 4) | (pairs[:, 1] >> 8)
+    out[:, 2] = pairs[:, 1] & 0xFF
+    return out.reshape(-1)[:(n * 12 + 7) // 8].tobytes()
+
+def unpack_indices_12(encoded_bytes, count):
+    """Inverse of pack_indices_12: read 'count' 12-bit indices."""
+    num_bytes = (count * 12 + 7) // 8
+    if len(encoded_bytes) < num_bytes:
+        raise ValueError("Mismatch in expected number of groups during decoding.")
+    b = np.zeros(((count + 1) // 2) * 3, dtype=np.uint16)
+    b[:num_bytes] = np.frombuffer(encoded_bytes, dtype=np.uint8, count=num_bytes)
+    b = b.reshape(-1, 3)
+    idx = np.empty((b.shape[0], 2), dtype=np.uint16)
+    idx[:, 0] = (b[:, 0] << 4) | (b[:, 1] >> 4)
+    idx[:, 1] = ((b[:, 1] & 0xF) << 8) | b[:, 2]
+    return idx.reshape(-1)[:count]
+
 def compress_file(input_file, output_file):
     """
     Compress a .rgba2 file using a dictionary of 4-pixel (24-bit) groups.
@@ -30,50 +93,26 @@ def compress_file(input_file, output_file):
     
     # Group every 4 pixels (each group is 24 bits total)
     num_groups = num_pixels // 4
-    groups = data.reshape(num_groups, 4)
-    # Pack 4 pixels into a 24-bit integer:
-    # p0 in bits 18-23, p1 in bits 12-17, p2 in bits 6-11, p3 in bits 0-5.
-    group_values = ((groups[:, 0].astype(np.uint32) << 18) |
-                    (groups[:, 1].astype(np.uint32) << 12) |
-                    (groups[:, 2].astype(np.uint32) << 6)  |
-                     groups[:, 3].astype(np.uint32))
+    group_values = pack_pixel_groups(data)
     
     # Build a dictionary of unique group values.
     unique_groups, inverse_indices = np.unique(group_values, return_inverse=True)
     dict_size = unique_groups.shape[0]
     # For our scheme we expect dict_size <= 4096 (i.e. indices fit in 12 bits)
-    if dict_size > 4096:
-        raise ValueError(f"Too many unique groups: {dict_size} (exceeds 4096)")
+    if dict_size > AGZ_MAX_DICT:
+        raise ValueError(f"Too many unique groups: {dict_size} (exceeds {AGZ_MAX_DICT})")
     
     # inverse_indices now maps each group to its dictionary index (each fits in 12 bits)
     indices = inverse_indices  # numpy array of length num_groups, values in 0..dict_size-1
 
     # Pack these 12-bit indices into a byte stream.
-    total_bits = num_groups * 12
-    num_bytes = (total_bits + 7) // 8
-    bit_buffer = 0
-    bits_in_buffer = 0
-    encoded_bytes = bytearray()
-    for idx in indices:
-        bit_buffer = (bit_buffer << 12) | int(idx)
-        bits_in_buffer += 12
-        # Extract whole bytes from the bit buffer.
-        while bits_in_buffer >= 8:
-            bits_in_buffer -= 8
-            byte = (bit_buffer >> bits_in_buffer) & 0xFF
-            encoded_bytes.append(byte)
-    # If any bits remain, pad to complete the last byte.
-    if bits_in_buffer > 0:
-        byte = (bit_buffer << (8 - bits_in_buffer)) & 0xFF
-        encoded_bytes.append(byte)
+    encoded_bytes = pack_indices_12(indices)
     
     # Build header: dictionary size (2 bytes, big-endian) and number of groups (4 bytes, big-endian).
     header = dict_size.to_bytes(2, byteorder="big") + num_groups.to_bytes(4, byteorder="big")
     
     # Build dictionary bytes: each unique group is stored as 3 bytes (24 bits, big-endian).
-    dict_bytes = bytearray()
-    for value in unique_groups:
-        dict_bytes.extend(int(value).to_bytes(3, byteorder="big"))
+    dict_bytes = groups_to_bytes(unique_groups)
     
     # Write header, dictionary, and encoded stream to output_file.
     with open(output_file, "wb") as f:
@@ -107,70 +146,180 @@ def decompress_file(input_file, output_file):
     dict_bytes_len = dict_size * 3
     if len(data) < 6 + dict_bytes_len:
         raise ValueError("Input file too short (missing dictionary)")
-    dict_bytes = data[6:6+dict_bytes_len]
-    unique_groups = []
-    for i in range(dict_size):
-        value = int.from_bytes(dict_bytes[i*3 : i*3+3], byteorder="big")
-        unique_groups.append(value)
+    unique_groups = bytes_to_groups(data[6:6+dict_bytes_len], dict_size)
     
     # The rest is the encoded pixel stream.
     encoded_bytes = data[6+dict_bytes_len:]
     
     # Unpack 12-bit indices from the encoded_bytes.
-    indices = []
-    bit_buffer = 0
-    bits_in_buffer = 0
-    for byte in encoded_bytes:
-        bit_buffer = (bit_buffer << 8) | byte
-        bits_in_buffer += 8
-        while bits_in_buffer >= 12 and len(indices) < num_groups:
-            bits_in_buffer -= 12
-            idx = (bit_buffer >> bits_in_buffer) & 0xFFF
-            indices.append(idx)
-    if len(indices) != num_groups:
-        raise ValueError("Mismatch in expected number of groups during decoding.")
+    indices = unpack_indices_12(encoded_bytes, num_groups)
     
-    # Reconstruct the original group values using the dictionary.
-    group_values = [unique_groups[idx] for idx in indices]
-    
-    # Unpack each 24-bit group into 4 pixels (each 6 bits).
-    # p0 = bits 18-23, p1 = bits 12-17, p2 = bits 6-11, p3 = bits 0-5.
-    # 1) Force alpha (bits 7-6 = 11) => OR with 0xC0.
-    # 2) If == 0xF3 => store 0x00 (fully transparent).
-    pixels = []
-    for value in group_values:
-        # Extract 6-bit channels
-        p0_6 = (value >> 18) & 0x3F
-        p1_6 = (value >> 12) & 0x3F
-        p2_6 = (value >> 6)  & 0x3F
-        p3_6 = value & 0x3F
-        
-        # Convert to 8-bit with alpha forced to 11
-        p0_8 = p0_6 | 0xC0
-        p1_8 = p1_6 | 0xC0
-        p2_8 = p2_6 | 0xC0
-        p3_8 = p3_6 | 0xC0
-        
-        # If the pixel is pure magenta w/ alpha => 0xF3, then store 0x00
-        # i.e. fully transparent in our .rgba2 representation.
-        if p0_8 == 0xF3:
-            p0_8 = 0x00
-        if p1_8 == 0xF3:
-            p1_8 = 0x00
-        if p2_8 == 0xF3:
-            p2_8 = 0x00
-        if p3_8 == 0xF3:
-            p3_8 = 0x00
-        
-        pixels.extend([p0_8, p1_8, p2_8, p3_8])
-    
-    pixel_data = bytes(pixels)
+    # Reconstruct the original group values using the dictionary,
+    # then unpack each 24-bit group into 4 pixels.
+    group_values = unique_groups[indices]
+    pixel_data = unpack_groups_to_pixels(group_values)
     
     with open(output_file, "wb") as f:
         f.write(pixel_data)
     print(f"Decompression complete: {input_file} -> {output_file}")
     print(f"  Reconstructed {len(pixel_data)} pixels.")
 
+# ------------------- Shared (per-segment) dictionary mode -------------------
+#
+# One dictionary covers all frames of an AGM segment (one second), unless their
+# groups do not fit in AGZ_MAX_DICT entries between them: then the segment is split
+# into runs of consecutive frames, each with its own sub-dictionary. A segment block is
+#
+#   1 byte   number of sub-dictionaries R (1 when the whole second fits)
+#   R sub-blocks, each sending only the changes from the dictionary before it
+#   (the previous sub-dictionary, or the previous segment's last one):
+#
+#   2 bytes  previous dictionary size P (big-endian; 0 = no previous dictionary)
+#   ceil(P/8) bytes  keep mask: bit (7 - i % 8) of byte i // 8 set if previous entry i is kept
+#   2 bytes  number of added entries A
+#   A*3 bytes  added entries (24 bits, big-endian)
+#   1 byte   number of frames F
+#   4 bytes  groups per frame G (big-endian)
+#   F * ceil(G*12/8) bytes  packed 12-bit indices for each frame
+#
+# A sub-block's dictionary is the kept previous entries (in their previous order)
+# followed by the added entries, so indices stay stable for groups that persist.
+
+def frame_groups(frame_bytes):
+    """Pack one RGBA2 frame (padded to a multiple of 4 pixels) into 24-bit groups."""
+    data = np.frombuffer(frame_bytes, dtype=np.uint8)
+    if len(data) % 4:
+        data = np.concatenate([data, np.zeros(4 - len(data) % 4, dtype=np.uint8)])
+    return pack_pixel_groups(data)
+
+def per_frame_compressed_size(frame_bytes):
+    """Size in bytes of one frame as written by compress_file (per-frame dictionary)."""
+    groups = frame_groups(frame_bytes)
+    dict_size = np.unique(groups).size
+    return 6 + dict_size * 3 + (groups.size * 12 + 7) // 8
+
+def dictionary_runs(packed):
+    """
+    Split a segment's frames (rows of 24-bit groups) into runs of consecutive frames
+    whose groups fit one dictionary. Returns a list of (first, end, used_groups).
+    """
+    runs = []
+    first, used = 0, np.unique(packed[0])
+    for i in range(1, len(packed)):
+        merged = np.union1d(used, packed[i])
+        if merged.size <= AGZ_MAX_DICT:
+            used = merged
+            continue
+        runs.append((first, i, used))
+        first, used = i, np.unique(packed[i])
+    runs.append((first, len(packed), used))
+    for first, end, used in runs:
+        if used.size > AGZ_MAX_DICT:
+            raise ValueError(f"Too many unique groups in frame {first}: {used.size} (exceeds {AGZ_MAX_DICT})")
+    return runs
+
+def compress_run(packed, used, prev_groups):
+    """One sub-block: frames (rows of groups) indexed into 'used', delta-coded against prev_groups."""
+    keep = np.isin(prev_groups, used)
+    added = np.setdiff1d(used, prev_groups[keep], assume_unique=True)
+    run_groups = np.concatenate([prev_groups[keep], added]).astype(np.uint32)
+
+    # Map each group value to its position in run_groups.
+    order = np.argsort(run_groups)
+    indices = order[np.searchsorted(run_groups[order], packed)]
+
+    out = bytearray()
+    out += len(prev_groups).to_bytes(2, byteorder="big")
+    out += np.packbits(keep).tobytes()
+    out += int(added.size).to_bytes(2, byteorder="big")
+    out += groups_to_bytes(added)
+    out += len(packed).to_bytes(1, byteorder="big")
+    out += int(packed.shape[1]).to_bytes(4, byteorder="big")
+    for row in indices:
+        out += pack_indices_12(row)
+    return bytes(out), run_groups
+
+def compress_segment(frames, prev_groups=None):
+    """
+    Compress a list of equal-sized RGBA2 frames (bytes) with one shared dictionary
+    (or as few sub-dictionaries as dictionary_runs needs), delta-coded against
+    prev_groups (the previous segment's dictionary, or None).
+    Returns (block_bytes, segment_groups); pass segment_groups on to the next segment.
+    """
+    packed = np.stack([frame_groups(f) for f in frames])
+    segment_groups = np.zeros(0, dtype=np.uint32) if prev_groups is None else prev_groups
+    runs = dictionary_runs(packed)
+    out = bytearray([len(runs)])
+    for first, end, used in runs:
+        run_block, segment_groups = compress_run(packed[first:end], used, segment_groups)
+        out += run_block
+    return bytes(out), segment_groups
+
+def decompress_segment(block, prev_groups=None):
+    """
+    Decode a block produced by compress_segment.
+    Returns (frames, segment_groups): a list of RGBA2 frames (bytes) and the
+    dictionary to pass to the next segment.
+    """
+    segment_groups = np.zeros(0, dtype=np.uint32) if prev_groups is None else prev_groups
+    frames = []
+    pos = 1
+    for _ in range(block[0]):
+        prev_size = int.from_bytes(block[pos:pos + 2], byteorder="big"); pos += 2
+        if prev_size != len(segment_groups):
+            raise ValueError(f"Segment expects a previous dictionary of {prev_size} entries, got {len(segment_groups)}")
+        mask_len = (prev_size + 7) // 8
+        keep = np.unpackbits(np.frombuffer(block, dtype=np.uint8, count=mask_len, offset=pos))[:prev_size].astype(bool)
+        pos += mask_len
+        num_added = int.from_bytes(block[pos:pos + 2], byteorder="big"); pos += 2
+        added = bytes_to_groups(block[pos:pos + num_added * 3], num_added); pos += num_added * 3
+        num_frames = block[pos]; pos += 1
+        num_groups = int.from_bytes(block[pos:pos + 4], byteorder="big"); pos += 4
+
+        segment_groups = np.concatenate([segment_groups[keep], added]).astype(np.uint32)
+        frame_len = (num_groups * 12 + 7) // 8
+        for _ in range(num_frames):
+            indices = unpack_indices_12(block[pos:pos + frame_len], num_groups)
+            pos += frame_len
+            frames.append(unpack_groups_to_pixels(segment_groups[indices]))
+    return frames, segment_groups
+
+def compare_dictionary_modes(frames_path, frame_size, frame_rate):
+    """
+    Compress a .frames clip both ways (per-frame dictionaries vs one delta-coded
+    dictionary per one-second segment) and report the bytes saved, and how many
+    seconds had to be split into sub-dictionaries.
+    """
+    with open(frames_path, "rb") as f:
+        frames_data = f.read()
+    total_frames = len(frames_data) // frame_size
+    frames = [frames_data[i * frame_size:(i + 1) * frame_size] for i in range(total_frames)]
+
+    per_frame_bytes = 0
+    per_segment_bytes = 0
+    split_segments = 0
+    sub_dictionaries = 0
+    prev_groups = None
+    for sec, start in enumerate(range(0, total_frames, frame_rate)):
+        segment = frames[start:start + frame_rate]
+        per_frame_bytes += sum(per_frame_compressed_size(fr) for fr in segment)
+        block, prev_groups = compress_segment(segment, prev_groups)
+        per_segment_bytes += len(block)
+        sub_dictionaries += block[0]
+        split_segments += block[0] > 1
+        print(f"\r\033[KSegment {sec + 1}: per-frame {per_frame_bytes} bytes, per-second {per_segment_bytes} bytes",
+              end="", flush=True)
+    print("")
+
+    saved = per_frame_bytes - per_segment_bytes
+    pct = 100.0 * saved / per_frame_bytes if per_frame_bytes else 0.0
+    print(f"Per-frame dictionaries:  {per_frame_bytes} bytes")
+    print(f"Per-second dictionaries: {per_segment_bytes} bytes "
+          f"({split_segments} of {-(-total_frames // frame_rate)} seconds split, {sub_dictionaries} dictionaries)")
+    print(f"Saved: {saved} bytes ({pct:.1f}%)")
+    return {"per_frame_bytes": per_frame_bytes, "per_segment_bytes": per_segment_bytes, "saved_bytes": saved,
+            "split_segments": split_segments, "sub_dictionaries": sub_dictionaries}
+
 
 # Example usage:
 if __name__ == "__main__":
@@ -180,3 +329,7 @@ if __name__ == "__main__":
     
     compress_file(in_file, comp_file)
     decompress_file(comp_file, decomp_file)
+
+    # Per-frame vs per-second dictionary overhead on a reference clip.
+    frames_path = "/home/smith/Agon/mystuff/assets/video/staging/Star_Wars__Battle_of_Yavin_bayer.frames"
+    compare_dictionary_modes(frames_path, 240 * 104, 10)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+In-process audio DSP for the WAV pipeline: polyphase resampling and float -> 8-bit
+unsigned conversion on NumPy blocks streamed from soundfile, so sources soundfile
+can decode (WAV, FLAC, ...) need no ffmpeg run per processing step.
+
+PolyphaseResampler is a streaming form of scipy.signal.resample_poly: the same
+Kaiser-windowed FIR (resample_poly's default design), run through scipy's polyphase
+upfirdn over each new block plus the few input samples the filter still reaches back
+to. Fed block by block it gives the same samples as resample_poly on the whole
+signal, with memory bounded by the block size.
+
+Quantization to pcm_u8 rounds x * 128 + 128 and clips. With dither, TPDF noise
+(difference of two uniform variables, +-1 LSB) is added first, which turns the
+quantization error of quiet passages into a steady noise floor instead of
+signal-correlated distortion.
+"""
+from math import gcd
+import numpy as np
+import soundfile as sf
+from scipy.signal import firwin, upfirdn
+from agon_wav import AgonWavWriter
+
+DSP_BLOCK_SIZE = 1 << 16
+KAISER_BETA = 5.0
+
+def can_decode(path):
+    """True if soundfile (libsndfile) can read the file, so the in-process path applies."""
+    try:
+        sf.info(path)
+        return True
+    except RuntimeError:
+        return False
+
+def to_mono(block):
+    """Average the channels of a (frames, channels) block, as ffmpeg's -ac 1 does."""
+    return block.mean(axis=1) if block.ndim > 1 else block
+
+class PolyphaseResampler:
+    """
+    Streaming resampler from src_rate to dst_rate.
+
+        resampler = PolyphaseResampler(44100, 15360)
+        for block in blocks:
+            out = resampler.process(block)
+        out = resampler.flush()
+    """
+    def __init__(self, src_rate, dst_rate):
+        g = gcd(src_rate, dst_rate)
+        self.up, self.down = dst_rate // g, src_rate // g
+        if self.up == self.down:
+            return  # same rate: process passes blocks through
+        max_rate = max(self.up, self.down)
+        self.half_len = 10 * max_rate
+        self.taps = firwin(2 * self.half_len + 1, 1.0 / max_rate, window=("kaiser", KAISER_BETA)) * self.up
+        # Input samples one output depends on (the filter span in input samples).
+        self.span = -(-len(self.taps) // self.up)
+        # Input history, preceded by zeros; history[j] is input sample history_start + j.
+        self.history = np.zeros(self.span, dtype=np.float64)
+        self.history_start = -self.span
+        self.total_in = 0
+        self.next_out = 0
+
+    def _outputs(self, end):
+        """Compute outputs next_out .. end-1 from the history (all inputs they need are present)."""
+        if end <= self.next_out:
+            return np.zeros(0, dtype=np.float32)
+        # Output n is sum_k x[k] * taps[n * down - k * up + half_len]. upfirdn over the
+        # history gives sum_k x[k] * taps[j * down - (k - start) * up]; the front is
+        # padded with zeros so that j = n + offset for a whole number offset.
+        pad = ((self.history_start * self.up - self.half_len) * pow(self.up, -1, self.down)) % self.down
+        start = self.history_start - pad
+        offset = (self.half_len - start * self.up) // self.down
+        window = np.concatenate([np.zeros(pad), self.history])
+        out = upfirdn(self.taps, window, self.up, self.down)[offset + self.next_out:offset + end]
+        self.next_out = end
+        # Drop history no later output can reach.
+        oldest_needed = (end * self.down + self.half_len) // self.up - self.span + 1
+        drop = min(max(oldest_needed - self.history_start, 0), len(self.history))
+        self.history = self.history[drop:]
+        self.history_start += drop
+        return out.astype(np.float32)
+
+    def process(self, block):
+        """Feed a block of mono samples; return the output samples now complete."""
+        if self.up == self.down:
+            return np.asarray(block, dtype=np.float32)
+        self.history = np.concatenate([self.history, np.asarray(block, dtype=np.float64)])
+        self.total_in += len(block)
+        # Output n needs input up to (n * down + half_len) // up.
+        end = (self.total_in * self.up - self.half_len - 1) // self.down + 1
+        return self._outputs(max(end, self.next_out))
+
+    def flush(self):
+        """Return the remaining outputs, treating input past the end as silence."""
+        if self.up == self.down:
+            return np.zeros(0, dtype=np.float32)
+        total_out = -(-self.total_in * self.up // self.down)
+        self.history = np.concatenate([self.history, np.zeros(self.half_len // self.up + 2)])
+        return self._outputs(total_out)
+
+def float_to_u8(samples, dither=False, rng=None):
+    """
+    Convert float samples in [-1, 1] to unsigned 8-bit PCM bytes, optionally with
+    TPDF dither (rng: a numpy Generator, so dither can be reproducible).
+    """
+    scaled = np.asarray(samples, dtype=np.float64) * 128.0
+    if dither:
+        rng = rng if rng is not None else np.random.default_rng()
+        scaled += rng.random(len(scaled)) - rng.random(len(scaled))
+    return np.clip(np.rint(scaled) + 128.0, 0, 255).astype(np.uint8)
+
+def iter_mono_resampled(input_path, target_rate=None, block_size=DSP_BLOCK_SIZE):
+    """Stream input_path from soundfile as mono float32 blocks at target_rate (None keeps the rate)."""
+    source_rate = sf.info(input_path).samplerate
+    target_rate = target_rate or source_rate
+    resampler = PolyphaseResampler(source_rate, target_rate)
+    for block in sf.blocks(input_path, blocksize=block_size, dtype="float32", always_2d=True):
+        out = resampler.process(to_mono(block))
+        if len(out):
+            yield out
+    out = resampler.flush()
+    if len(out):
+        yield out
+
+def resample_file(input_path, output_path, target_rate, subtype="PCM_16", block_size=DSP_BLOCK_SIZE):
+    """Resample input_path to a mono WAV of the given soundfile subtype."""
+    with sf.SoundFile(output_path, "w", samplerate=target_rate, channels=1, subtype=subtype, format="WAV") as out:
+        for block in iter_mono_resampled(input_path, target_rate, block_size):
+            out.write(block)
+
+def resample_to_u8_wav(input_path, output_path, target_rate, dither=False, seed=None, block_size=DSP_BLOCK_SIZE):
+    """
+    Resample input_path and write it as 8-bit unsigned mono PCM with the canonical
+    Agon header. Returns the number of sample bytes written.
+    """
+    rng = np.random.default_rng(seed) if dither else None
+    with AgonWavWriter(output_path, target_rate) as writer:
+        for block in iter_mono_resampled(input_path, target_rate, block_size):
+            writer.write(float_to_u8(block, dither, rng).tobytes())
+    return writer.data_size
@@ -20,6 +20,14 @@ def pick_audio_sample_rate(width, height, fps, max_bps, desired_rate=None):
     if video_bps % 60 != 0:
         raise ValueError(f"Video bytes/sec = {video_bps} is not divisible by 60!")
 
+    return fit_audio_rate(video_bps, max_bps, desired_rate)
+
+def fit_audio_rate(video_bps, max_bps, desired_rate=None):
+    """
+    Steps 2) to 4) of pick_audio_sample_rate for any video_bps, including a measured
+    compressed rate that need not be a multiple of 60 (see agm_planner.py).
+    Returns the chosen sample rate, a multiple of 60.
+    """
     leftover = max_bps - video_bps
     if leftover < 0:
         raise ValueError(
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Vectorized Floyd-Steinberg error diffusion to an Agon palette.
+
+Error diffusion is serial within a frame: every pixel depends on the one before it
+and on the row above, and a serpentine scan serializes whole rows. Instead of
+fighting that, frames are processed in batches: the scan visits pixel (y, x) of all
+N frames of a batch at once, so each step is one small NumPy operation over N pixels
+and per-step overhead is shared across the batch. Per row only the horizontal
+7/16 carry is stepped pixel by pixel; the 3/16, 5/16, 1/16 contributions to the next
+row are spread with one vectorized operation once the row is done.
+
+Quantization is exact nearest colour (Euclidean RGB). When the palette is a full
+grid of per-channel levels (Agon64: 4 levels of R, G and B) the nearest colour is
+found per channel through 256-entry tables; otherwise (e.g. Agon63) the nearest of
+the K palette colours is computed directly.
+
+Tolerance against agonutils' 'floyd': error diffusion amplifies tiny rounding
+differences, so pixel-exact agreement is not expected. floyd_tolerance_report
+measures what should agree: the mean absolute per-channel difference of the two
+results after a 4x4 box blur (the perceived colour; target <= FLOYD_BLUR_TOLERANCE
+levels of 255) and the L1 distance of their palette-usage histograms (target <=
+FLOYD_HIST_TOLERANCE). Running this module with agonutils installed prints that
+report for the reference stills in tests/ (compare_with_agonutils).
+
+make_images.py uses floyd_image instead of agonutils when its floyd_backend is
+"numpy". Transparency then comes from the alpha channel only (alpha < 128).
+"""
+import time
+import numpy as np
+
+FLOYD_BLUR_TOLERANCE = 8.0
+FLOYD_HIST_TOLERANCE = 0.05
+DEFAULT_BATCH_FRAMES = 128
+
+def load_gpl_palette(palette_filepath):
+    """Read a GIMP .gpl palette. Returns a (K, 3) uint8 array of RGB colours."""
+    colours = []
+    with open(palette_filepath, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and all(p.isdigit() for p in parts[:3]):
+                colours.append([int(p) for p in parts[:3]])
+    if not colours:
+        raise ValueError(f"No colours found in palette {palette_filepath}")
+    return np.array(colours, dtype=np.uint8)
+
+def palette_grid(palette):
+    """
+    If the palette is exactly the product of per-channel level sets, return
+    (levels, lut, grid_index): the level values per channel, (3, 256) tables of the
+    nearest level index per channel value, and the palette index of each level
+    combination. Otherwise return None.
+    """
+    levels = [np.unique(palette[:, c]) for c in range(3)]
+    if len(palette) != len(levels[0]) * len(levels[1]) * len(levels[2]) or len(np.unique(palette, axis=0)) != len(palette):
+        return None
+    values = np.arange(256)
+    lut = np.stack([np.abs(values[:, np.newaxis] - lv[np.newaxis, :].astype(int)).argmin(axis=1) for lv in levels])
+    grid_index = np.zeros([len(lv) for lv in levels], dtype=np.uint8)
+    for k, (r, g, b) in enumerate(palette):
+        grid_index[np.searchsorted(levels[0], r), np.searchsorted(levels[1], g), np.searchsorted(levels[2], b)] = k
+    return levels, lut, grid_index
+
+def palette_to_rgba2(palette):
+    """RGBA2222 byte (AABBGGRR, opaque) for each palette colour."""
+    q = np.rint(palette.astype(np.float64) / 85.0).astype(np.uint8)
+    return (0xC0 | (q[:, 2] << 4) | (q[:, 1] << 2) | q[:, 0]).astype(np.uint8)
+
+def floyd_steinberg(frames, palette, serpentine=True, opaque=None):
+    """
+    Dither a batch of RGB frames, shape (N, H, W, 3) or (H, W, 3), to palette indices.
+    opaque is an optional (N, H, W) bool mask; pixels outside it neither take nor
+    pass on error. Returns a (N, H, W) uint8 array of palette indices.
+    """
+    frames = np.asarray(frames)
+    if frames.ndim == 3:
+        frames = frames[np.newaxis]
+    n, height, width, _ = frames.shape
+    grid = palette_grid(palette)
+    pal = palette.astype(np.float32)
+    pal_norm = (pal ** 2).sum(axis=1)
+    channels = np.arange(3)
+    if grid is not None:
+        levels, lut, grid_index = grid
+        # Nearest level value per channel value, for the quantization step itself.
+        qlut = np.stack([levels[c][lut[c]] for c in range(3)]).astype(np.float32)
+
+    work = frames.astype(np.float32)
+    weight = None if opaque is None else opaque[..., np.newaxis].astype(np.float32)
+    out = np.empty((n, height, width), dtype=np.uint8)
+    row_err = np.empty((n, width, 3), dtype=np.float32)
+    row_val = np.empty((n, width, 3), dtype=np.intp)
+
+    for y in range(height):
+        reverse = serpentine and (y & 1)
+        xs = range(width - 1, -1, -1) if reverse else range(width)
+        row = work[:, y]
+        carry = np.zeros((n, 3), dtype=np.float32)
+        for x in xs:
+            v = row[:, x] + carry
+            np.clip(v, 0.0, 255.0, out=v)
+            if grid is not None:
+                vi = np.rint(v).astype(np.intp)
+                row_val[:, x] = vi
+                err = v - qlut[channels, vi]
+            else:
+                k = (pal_norm[np.newaxis, :] - 2.0 * v @ pal.T).argmin(axis=1)
+                out[:, y, x] = k
+                err = v - pal[k]
+            if weight is not None:
+                err *= weight[:, y, x]
+            row_err[:, x] = err
+            carry = err * (7.0 / 16.0)
+        if grid is not None:
+            li = lut[channels, row_val]
+            out[:, y] = grid_index[li[..., 0], li[..., 1], li[..., 2]]
+        if y + 1 < height:
+            below = work[:, y + 1]
+            below += row_err * (5.0 / 16.0)
+            if reverse:
+                below[:, 1:] += row_err[:, :-1] * (3.0 / 16.0)
+                below[:, :-1] += row_err[:, 1:] * (1.0 / 16.0)
+            else:
+                below[:, :-1] += row_err[:, 1:] * (3.0 / 16.0)
+                below[:, 1:] += row_err[:, :-1] * (1.0 / 16.0)
+    return out
+
+def floyd_rgba2(rgba_frames, palette, serpentine=True, batch_frames=DEFAULT_BATCH_FRAMES):
+    """
+    Dither RGBA32 frames (N, H, W, 4) to RGBA2 frames (N, H * W), batch_frames at a
+    time. Pixels with alpha < 128 become 0x00 (transparent) and take no part in the
+    error diffusion.
+    """
+    rgba_frames = np.asarray(rgba_frames, dtype=np.uint8)
+    if rgba_frames.ndim == 3:
+        rgba_frames = rgba_frames[np.newaxis]
+    n, height, width, _ = rgba_frames.shape
+    to_rgba2 = palette_to_rgba2(palette)
+    out = np.empty((n, height * width), dtype=np.uint8)
+    for start in range(0, n, batch_frames):
+        batch = rgba_frames[start:start + batch_frames]
+        opaque = batch[..., 3] >= 128
+        idx = floyd_steinberg(batch[..., :3], palette, serpentine, opaque)
+        out[start:start + len(batch)] = np.where(opaque, to_rgba2[idx], 0).reshape(len(batch), -1)
+    return out
+
+def floyd_image(rgba, palette, serpentine=True):
+    """
+    Dither one RGBA32 image (H, W, 4) with floyd_rgba2. Returns (rgba32, rgba2):
+    the palette colours as RGBA32 bytes (transparent pixels 0, 0, 0, 0) and the
+    packed RGBA2 bytes.
+    """
+    rgba = np.asarray(rgba, dtype=np.uint8)
+    rgba2 = floyd_rgba2(rgba, palette, serpentine)[0]
+    opaque = rgba[..., 3].reshape(-1) >= 128
+    idx = rgba2_to_palette_index(rgba2, palette)
+    rgba32 = np.zeros((rgba2.size, 4), dtype=np.uint8)
+    rgba32[opaque, :3] = palette[idx[opaque]]
+    rgba32[opaque, 3] = 255
+    return rgba32.tobytes(), rgba2.tobytes()
+
+def rgba2_to_palette_index(rgba2, palette):
+    """Palette index of each opaque RGBA2 pixel (transparent pixels map to 0)."""
+    lookup = np.zeros(256, dtype=np.uint8)
+    lookup[palette_to_rgba2(palette)] = np.arange(len(palette), dtype=np.uint8)
+    return lookup[np.asarray(rgba2, dtype=np.uint8)]
+
+def rgb_to_palette_index(rgb, palette):
+    """Palette index of each pixel of an (..., 3) image already in palette colours (nearest match)."""
+    flat = np.asarray(rgb, dtype=np.int32).reshape(-1, 3)
+    dist = ((flat[:, np.newaxis, :] - palette.astype(np.int32)[np.newaxis, :, :]) ** 2).sum(axis=2)
+    return dist.argmin(axis=1).astype(np.uint8).reshape(np.shape(rgb)[:-1])
+
+def box_blur(rgb, size=4):
+    """Mean over size x size tiles of an (H, W, 3) image (edges cropped)."""
+    h, w = rgb.shape[0] // size * size, rgb.shape[1] // size * size
+    return rgb[:h, :w].astype(np.float64).reshape(h // size, size, w // size, size, 3).mean(axis=(1, 3))
+
+def floyd_tolerance_report(ours, reference, palette):
+    """
+    Compare two (H, W) palette-index images of the same source (e.g. floyd_steinberg
+    and agonutils 'floyd'). Returns a dict with pixel_match, blur_mae, hist_l1 and
+    within_tolerance.
+    """
+    pal = palette.astype(np.float64)
+    blur_mae = float(np.abs(box_blur(pal[ours]) - box_blur(pal[reference])).mean())
+    k = len(palette)
+    hist_l1 = float(np.abs(
+        np.bincount(ours.reshape(-1), minlength=k) - np.bincount(reference.reshape(-1), minlength=k)
+    ).sum()) / ours.size
+    return {
+        "pixel_match": float((ours == reference).mean()),
+        "blur_mae": blur_mae,
+        "hist_l1": hist_l1,
+        "within_tolerance": blur_mae <= FLOYD_BLUR_TOLERANCE and hist_l1 <= FLOYD_HIST_TOLERANCE,
+    }
+
+def benchmark(palette, width=320, height=240, num_frames=DEFAULT_BATCH_FRAMES, serpentine=True):
+    """Dither num_frames synthetic gradient frames in one batch and return frames per second."""
+    yy, xx = np.mgrid[0:height, 0:width]
+    frames = np.empty((num_frames, height, width, 3), dtype=np.uint8)
+    for i in range(num_frames):
+        frames[i, ..., 0] = (xx * 255 // max(width - 1, 1) + i) % 256
+        frames[i, ..., 1] = yy * 255 // max(height - 1, 1)
+        frames[i, ..., 2] = ((xx + yy + 3 * i) * 255 // (width + height)) % 256
+    start = time.perf_counter()
+    floyd_steinberg(frames, palette, serpentine)
+    elapsed = time.perf_counter() - start
+    fps = num_frames / elapsed
+    print(f"Floyd-Steinberg {width}x{height}, batch of {num_frames}: {elapsed:.2f}s, {fps:.1f} fps")
+    return fps
+
+def compare_with_agonutils(image_paths, palette_filepath):
+    """
+    Dither each image both ways (floyd_steinberg and agonutils 'floyd') and print
+    floyd_tolerance_report for it. Returns the list of reports.
+    """
+    import agonutils as au
+    from PIL import Image
+    palette = load_gpl_palette(palette_filepath)
+    reports = []
+    for path in image_paths:
+        with Image.open(path) as img:
+            img = img.convert("RGB")
+        width, height = img.size
+        ours = floyd_steinberg(np.asarray(img), palette)[0]
+        converted = au.convert_to_palette_bytes(
+            img.convert("RGBA").tobytes(), width, height, palette_filepath, "floyd", None
+        )
+        reference = rgb_to_palette_index(
+            np.frombuffer(converted, dtype=np.uint8).reshape(height, width, 4)[..., :3], palette
+        )
+        report = floyd_tolerance_report(ours, reference, palette)
+        print(f"{path}: pixel match {report['pixel_match']:.3f}, blur MAE {report['blur_mae']:.2f} "
+              f"(<= {FLOYD_BLUR_TOLERANCE}), histogram L1 {report['hist_l1']:.4f} (<= {FLOYD_HIST_TOLERANCE}), "
+              f"{'within' if report['within_tolerance'] else 'OUTSIDE'} tolerance")
+        reports.append(report)
+    return reports
+
+if __name__ == "__main__":
+    palette_filepath = "/home/smith/Agon/mystuff/assets/images/palettes/Agon64.gpl"
+    palette = load_gpl_palette(palette_filepath)
+    benchmark(palette)
+    compare_with_agonutils(["../../tests/nature.png", "../../tests/rainbow_swirl.png"], palette_filepath)
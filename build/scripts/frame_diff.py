@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Vectorized frame differencing over RGBA2 frame stacks.
+
+A .frames file is a headerless concatenation of RGBA2 frames (one byte per pixel),
+as written by agm_make.extract_and_process_frames. Everything here works on 2-D
+uint8 arrays of shape (num_frames, frame_size), so a memory-mapped .frames file
+can be diffed, patched or masked in one pass without copying it into RAM.
+
+Diff convention (same as the older per-byte helpers):
+  - A pixel that differs from the reference frame keeps its current value.
+  - A pixel that is unchanged is written as 0.
+  - The first frame of a clip is stored raw unless an explicit reference is given.
+"""
+import os
+import numpy as np
+
+DEFAULT_CHUNK_FRAMES = 256  # Frames per block when streaming file-to-file
+
+def open_frames(frames_path, frame_size, mode="r"):
+    """
+    Memory-map a .frames file as a (num_frames, frame_size) uint8 array.
+    Any trailing partial frame is ignored.
+    """
+    total_frames = os.path.getsize(frames_path) // frame_size
+    return np.memmap(frames_path, dtype=np.uint8, mode=mode, shape=(total_frames, frame_size))
+
+def as_frame(frame):
+    """Return a 1-D uint8 view of a bytes-like frame (no copy)."""
+    if isinstance(frame, np.ndarray):
+        return frame.reshape(-1)
+    return np.frombuffer(frame, dtype=np.uint8)
+
+def previous_frames(frames, reference=None):
+    """
+    Return the stack of reference frames for each frame in 'frames':
+    frames shifted down by one, with 'reference' (or the first frame itself when
+    None) in slot 0.
+    """
+    prev = np.empty_like(frames)
+    prev[1:] = frames[:-1]
+    prev[0] = frames[0] if reference is None else as_frame(reference)
+    return prev
+
+def changed_mask(frames, reference=None):
+    """
+    Boolean (num_frames, frame_size) array, True where a pixel differs from
+    the same pixel in the previous frame. Row 0 is compared with 'reference';
+    if no reference is given, every pixel of frame 0 counts as changed.
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    mask = frames != previous_frames(frames, reference)
+    if reference is None and len(frames):
+        mask[0] = True
+    return mask
+
+def diff_frames(frames, reference=None, out=None):
+    """
+    Diff a stack of frames against their predecessors.
+    Returns a (num_frames, frame_size) uint8 array (written into 'out' if given,
+    which may itself be a writable memmap).
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    if out is None:
+        out = np.empty_like(frames)
+    mask = changed_mask(frames, reference)
+    np.multiply(frames, mask, out=out, casting="unsafe")
+    return out
+
+def patch_frame(reference, diff):
+    """
+    Apply one diff frame to its reference frame: non-zero diff pixels replace
+    the reference, zero pixels keep it. Returns a new uint8 array.
+    """
+    ref = as_frame(reference)
+    d = as_frame(diff)
+    return np.where(d != 0, d, ref)
+
+def patch_frames(diffs, reference=None, out=None):
+    """
+    Rebuild a stack of frames from a stack of diffs. Each frame depends on the
+    previous one, so the loop is over frames; the work inside it is vectorized
+    over the whole frame. When 'reference' is None, diffs[0] is taken as raw.
+    """
+    diffs = np.asarray(diffs, dtype=np.uint8)
+    if diffs.ndim == 1:
+        diffs = diffs[np.newaxis, :]
+    if out is None:
+        out = np.empty_like(diffs)
+    current = diffs[0].copy() if reference is None else patch_frame(reference, diffs[0])
+    out[0] = current
+    for i in range(1, len(diffs)):
+        d = diffs[i]
+        np.copyto(current, d, where=(d != 0))
+        out[i] = current
+    return out
+
+def changed_counts(frames, reference=None):
+    """Number of changed pixels per frame, as a 1-D int64 array."""
+    return changed_mask(frames, reference).sum(axis=1)
+
+def changed_bbox(reference, frame, width, height):
+    """
+    Bounding box (x, y, w, h) of the pixels that differ between two frames of
+    width x height, or None if the frames are identical.
+    """
+    mask = (as_frame(frame) != as_frame(reference)).reshape(height, width)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    y, x = int(rows[0]), int(cols[0])
+    return x, y, int(cols[-1]) + 1 - x, int(rows[-1]) + 1 - y
+
+def crop_frame(frame, width, height, box):
+    """Cut the (x, y, w, h) sub-image out of a width x height frame; returns bytes."""
+    x, y, w, h = box
+    return as_frame(frame).reshape(height, width)[y:y + h, x:x + w].tobytes()
+
+def paste_frame(frame, width, height, box, sub_image):
+    """Return a copy of 'frame' with the (x, y, w, h) sub-image pasted in, as bytes."""
+    x, y, w, h = box
+    out = as_frame(frame).reshape(height, width).copy()
+    out[y:y + h, x:x + w] = as_frame(sub_image).reshape(h, w)
+    return out.tobytes()
+
+def diff_frames_file(src_path, dst_path, frame_size, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """
+    Diff an entire .frames file into a new .frames file of the same size.
+    The source is memory-mapped and processed in blocks of 'chunk_frames',
+    carrying the last frame of each block over as the next block's reference.
+    Returns the per-frame changed-pixel counts.
+    """
+    src = open_frames(src_path, frame_size)
+    total_frames = src.shape[0]
+    counts = np.zeros(total_frames, dtype=np.int64)
+    reference = None
+    with open(dst_path, "wb") as f_out:
+        for start in range(0, total_frames, chunk_frames):
+            block = np.asarray(src[start:start + chunk_frames])
+            mask = changed_mask(block, reference)
+            counts[start:start + len(block)] = mask.sum(axis=1)
+            f_out.write((block * mask).astype(np.uint8).tobytes())
+            reference = block[-1]
+    return counts
+
+def compute_diff_frame(prev_frame, curr_frame):
+    """
+    Bytes-in, bytes-out diff of a single frame pair.
+      - If prev_frame is None, returns curr_frame (first frame stored raw).
+      - Otherwise, outputs the current pixel value if it differs from the previous frame,
+        otherwise outputs 0.
+    """
+    if prev_frame is None:
+        return curr_frame
+    prev = as_frame(prev_frame)
+    curr = as_frame(curr_frame)
+    return np.where(curr != prev, curr, 0).astype(np.uint8).tobytes()
+
+if __name__ == "__main__":
+    frames_path = "/home/smith/Agon/mystuff/assets/video/staging/Star_Wars__Battle_of_Yavin_bayer.frames"
+    diffed_path = frames_path.replace(".frames", "_diffed.frames")
+    width, height = 240, 104
+
+    counts = diff_frames_file(frames_path, diffed_path, width * height)
+    print(f"Diffed {len(counts)} frames to {diffed_path}")
+    print(f"Mean changed pixels per frame: {counts.mean():.1f} of {width * height}")
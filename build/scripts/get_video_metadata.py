@@ -1,33 +1,28 @@
 #!/usr/bin/env python3
 
 import subprocess
-import json
 import sys
+import media_probe
+
+VIDEO_PROBE_ENTRIES = 'format=duration:format_tags=*:stream=codec_type,codec_name,width,height,sample_aspect_ratio:stream_tags=rotate:stream_side_data=rotation'
 
 def get_video_metadata(video_path):
     """
     Uses ffprobe to get metadata of a video file and returns it as a dict.
+    Results are cached by path, size and mtime (media_probe).
     """
-    # Build the ffprobe command to produce JSON output
-    cmd = [
-        'ffprobe',
-        '-v', 'error',
-        '-show_entries', 'format=duration:format_tags=*:stream=codec_type,codec_name,width,height',
-        '-print_format', 'json',
-        video_path
-    ]
-
-    # Run ffprobe and capture JSON output
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Error running ffprobe: {result.stderr}")
-        sys.exit(result.returncode)
-
-    # Parse JSON output
-    metadata_json = result.stdout
-    metadata = json.loads(metadata_json)
+    try:
+        return media_probe.probe(video_path, VIDEO_PROBE_ENTRIES)
+    except subprocess.CalledProcessError as e:
+        print(f"Error running ffprobe: {e.stderr}")
+        sys.exit(e.returncode)
 
-    return metadata
+def get_video_metadata_many(video_paths, jobs=media_probe.DEFAULT_PROBE_JOBS):
+    """
+    Metadata for many video files, probing the uncached ones concurrently.
+    Returns {path: metadata}, with None for files ffprobe could not read.
+    """
+    return media_probe.probe_many(video_paths, VIDEO_PROBE_ENTRIES, jobs=jobs)
 
 def pretty_print_metadata(metadata, video_path):
     """
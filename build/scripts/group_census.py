@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Census of unique 4-pixel groups over a whole .frames clip.
+
+Each RGBA2 pixel keeps 6 colour bits, so 4 consecutive pixels pack into one 24-bit
+group value (the unit agz.py builds its dictionary from). This tool memory-maps a
+.frames file and, in one pass split across worker processes, computes:
+  - unique groups per frame (the agz per-frame dictionary size),
+  - unique groups per second (the size of a shared per-segment dictionary),
+  - a global frequency table over the 2^24 group space.
+The summary tells whether agz's 12-bit indices fit and how many dictionary bytes
+per-frame vs per-second dictionaries would cost.
+"""
+import os
+import csv
+import concurrent.futures
+import numpy as np
+from frame_diff import open_frames
+from agz import AGZ_MAX_DICT
+
+GROUP_SIZE = 4
+GROUP_SPACE = 1 << 24
+AGZ_DICT_ENTRY_BYTES = 3
+
+def pack_groups(frames):
+    """
+    Pack every 4 pixels of each frame into a 24-bit integer:
+    p0 in bits 18-23, p1 in bits 12-17, p2 in bits 6-11, p3 in bits 0-5.
+    Input is (num_frames, frame_size); trailing pixels beyond a multiple of 4 are ignored.
+    Returns a (num_frames, frame_size // 4) uint32 array.
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    num_groups = frames.shape[1] // GROUP_SIZE
+    groups = (frames[:, :num_groups * GROUP_SIZE] & 0x3F).reshape(frames.shape[0], num_groups, GROUP_SIZE)
+    groups = groups.astype(np.uint32)
+    return (groups[:, :, 0] << 18) | (groups[:, :, 1] << 12) | (groups[:, :, 2] << 6) | groups[:, :, 3]
+
+def unique_per_label(keys_2d, row_labels):
+    """
+    Number of distinct values per label, where each row of the 2-D uint32 array
+    'keys_2d' carries the label at the same position in 'row_labels'.
+    """
+    row_labels = np.asarray(row_labels, dtype=np.uint64)
+    tagged = (row_labels[:, np.newaxis] << np.uint64(24)) | keys_2d.astype(np.uint64)
+    uniq = np.unique(tagged)
+    return np.bincount((uniq >> np.uint64(24)).astype(np.int64), minlength=int(row_labels.max()) + 1)
+
+def census_chunk(frames_path, frame_size, frame_rate, start, end):
+    """
+    Worker: census of frames [start, end). 'start' must fall on a second boundary.
+    Returns (per_frame_unique, per_second_unique, groups, counts), where groups/counts
+    is the sparse frequency table of this chunk.
+    """
+    frames = open_frames(frames_path, frame_size)
+    packed = pack_groups(frames[start:end])
+    rows = np.arange(packed.shape[0])
+    per_frame = unique_per_label(packed, rows)
+    per_second = unique_per_label(packed, rows // frame_rate)
+    groups, counts = np.unique(packed, return_counts=True)
+    return per_frame, per_second, groups, counts
+
+def census_frames_file(frames_path, frame_size, frame_rate, chunk_secs=10, jobs=None):
+    """
+    Run the census over a whole .frames file on a process pool.
+    Returns a dict with per_frame_unique, per_second_unique (1-D int arrays) and
+    global_counts (int64 array of length 2^24).
+    """
+    total_frames = open_frames(frames_path, frame_size).shape[0]
+    chunk_frames = chunk_secs * frame_rate
+    bounds = [(s, min(s + chunk_frames, total_frames)) for s in range(0, total_frames, chunk_frames)]
+
+    per_frame = np.zeros(total_frames, dtype=np.int64)
+    per_second = np.zeros(-(-total_frames // frame_rate), dtype=np.int64)
+    global_counts = np.zeros(GROUP_SPACE, dtype=np.int64)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(census_chunk, frames_path, frame_size, frame_rate, start, end): (start, end)
+            for start, end in bounds
+        }
+        for n, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            start, end = futures[future]
+            pf, ps, groups, counts = future.result()
+            per_frame[start:end] = pf
+            sec0 = start // frame_rate
+            per_second[sec0:sec0 + len(ps)] = ps
+            global_counts[groups] += counts
+            print(f"\r\033[KCensus chunk {n} of {len(bounds)}", end="", flush=True)
+    print("")
+
+    return {
+        "per_frame_unique": per_frame,
+        "per_second_unique": per_second,
+        "global_counts": global_counts,
+    }
+
+def summarize_census(census):
+    """
+    Derive AGZ sizing figures from a census:
+      - how many frames overflow the 4096-entry (12-bit) dictionary,
+      - dictionary bytes per second with per-frame vs shared per-second dictionaries,
+      - the number of distinct groups in the whole clip.
+    """
+    per_frame = census["per_frame_unique"]
+    per_second = census["per_second_unique"]
+    num_secs = len(per_second)
+    per_frame_dict_bytes = per_frame.sum() * AGZ_DICT_ENTRY_BYTES
+    per_second_dict_bytes = per_second.sum() * AGZ_DICT_ENTRY_BYTES
+    return {
+        "frames": len(per_frame),
+        "seconds": num_secs,
+        "max_unique_per_frame": int(per_frame.max()) if len(per_frame) else 0,
+        "mean_unique_per_frame": float(per_frame.mean()) if len(per_frame) else 0.0,
+        "frames_over_agz_dict": int((per_frame > AGZ_MAX_DICT).sum()),
+        "max_unique_per_second": int(per_second.max()) if num_secs else 0,
+        "seconds_over_agz_dict": int((per_second > AGZ_MAX_DICT).sum()),
+        "distinct_groups_in_clip": int(np.count_nonzero(census["global_counts"])),
+        "per_frame_dict_bytes_per_sec": float(per_frame_dict_bytes) / max(num_secs, 1),
+        "per_second_dict_bytes_per_sec": float(per_second_dict_bytes) / max(num_secs, 1),
+    }
+
+def write_census_csv(census, frame_rate, csv_base, top_n=4096):
+    """
+    Write three CSV files next to csv_base:
+      <base>_frames.csv   frame, second, unique_groups
+      <base>_seconds.csv  second, unique_groups
+      <base>_groups.csv   the top_n most frequent groups: group (hex), count
+    """
+    os.makedirs(os.path.dirname(csv_base) or ".", exist_ok=True)
+    with open(f"{csv_base}_frames.csv", "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["frame", "second", "unique_groups"])
+        for i, n in enumerate(census["per_frame_unique"].tolist()):
+            writer.writerow([i, i // frame_rate, n])
+    with open(f"{csv_base}_seconds.csv", "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["second", "unique_groups"])
+        writer.writerows(enumerate(census["per_second_unique"].tolist()))
+    counts = census["global_counts"]
+    nonzero = np.flatnonzero(counts)
+    top = nonzero[np.argsort(counts[nonzero])[::-1][:top_n]]
+    with open(f"{csv_base}_groups.csv", "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["group", "count"])
+        for g in top.tolist():
+            writer.writerow([f"{g:06X}", int(counts[g])])
+
+if __name__ == "__main__":
+    frames_path = "/home/smith/Agon/mystuff/assets/video/staging/Star_Wars__Battle_of_Yavin_bayer.frames"
+    csv_base = "/home/smith/Agon/mystuff/assets/video/staging/Star_Wars__Battle_of_Yavin_bayer_census"
+    width, height = 240, 104
+    frame_rate = 10
+
+    census = census_frames_file(frames_path, width * height, frame_rate)
+    write_census_csv(census, frame_rate, csv_base)
+    for key, value in summarize_census(census).items():
+        print(f"{key}: {value}")
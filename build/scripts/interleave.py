@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Byte interleaving of multi-frame buckets.
+
+Interleaving a bucket of N equal-sized frames writes byte 0 of every frame, then
+byte 1 of every frame, and so on. Static pixels then form runs of N identical
+bytes, which RLE2 and SZIP pick up far better than the same frames concatenated.
+"""
+import numpy as np
+
+def stack_frames(frames):
+    """
+    Stack a list of equal-length bytes-like frames (bytes, bytearray, memoryview
+    or 1-D uint8 arrays) into a (num_frames, frame_len) uint8 array.
+    """
+    return np.stack([np.frombuffer(memoryview(f), dtype=np.uint8) for f in frames])
+
+def interleave_frames(frames):
+    """
+    Given a list of frames (or a 2-D uint8 array of shape (num_frames, frame_len)),
+    return a bytes object with the data interleaved byte-by-byte.
+    Assumes all frames have the same length.
+    """
+    if len(frames) == 0:
+        return b""
+    arr = frames if isinstance(frames, np.ndarray) else stack_frames(frames)
+    return np.ascontiguousarray(arr.T).tobytes()
+
+def deinterleave_frames(data, num_frames):
+    """
+    Inverse of interleave_frames: split interleaved bytes back into a list of
+    'num_frames' frames (as bytes).
+    """
+    arr = np.frombuffer(memoryview(data), dtype=np.uint8)
+    if num_frames <= 0 or arr.size % num_frames != 0:
+        raise ValueError(f"Cannot split {arr.size} bytes into {num_frames} equal frames")
+    frames = arr.reshape(arr.size // num_frames, num_frames).T
+    return [row.tobytes() for row in frames]
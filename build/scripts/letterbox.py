@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Automatic letterbox / pillarbox detection.
+
+Samples a handful of frames from the source through a single ffmpeg rawvideo pipe
+(8-bit luma only), takes each frame's per-row and per-column luminance maxima, and
+keeps every row/column that carries picture in enough of the samples. The result
+is one crop box for the whole clip, meant to go into the ffmpeg filter graph
+("crop=w:h:x:y") so cropping costs nothing per frame.
+
+Boxes are in the pixels ffmpeg decodes: after autorotation, and not yet square if
+the stream has a sample aspect ratio. display_aspect gives a box's shape on screen,
+which is what the target frame size has to follow.
+"""
+import subprocess
+from fractions import Fraction
+import numpy as np
+from get_video_metadata import get_video_metadata
+
+def parse_ratio(value):
+    """ffprobe's "N:D" sample aspect ratio as a Fraction; unset ("0:1", "N/A", None) is square."""
+    try:
+        num, den = (int(v) for v in str(value).split(":"))
+    except ValueError:
+        return Fraction(1)
+    return Fraction(num, den) if num > 0 and den > 0 else Fraction(1)
+
+def stream_rotation(stream):
+    """Rotation in degrees from the display matrix side data, or the older rotate tag."""
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            return int(float(side_data["rotation"]))
+    return int(float(stream.get("tags", {}).get("rotate", 0)))
+
+def probe_video_geometry(video_path):
+    """
+    Return (width, height, sar) of the first video stream as ffmpeg decodes it.
+    ffmpeg autorotates, so a stream rotated by 90 or 270 degrees comes out with
+    width and height swapped and the sample aspect ratio (a Fraction) inverted.
+    """
+    metadata = get_video_metadata(video_path)
+    for stream in metadata.get("streams", []):
+        if stream.get("codec_type") == "video":
+            width, height = int(stream["width"]), int(stream["height"])
+            sar = parse_ratio(stream.get("sample_aspect_ratio"))
+            if stream_rotation(stream) % 180:
+                return height, width, 1 / sar
+            return width, height, sar
+    raise RuntimeError(f"No video stream found in {video_path}")
+
+def probe_video_size(video_path):
+    """Return (width, height) of the first video stream, as decoded (after autorotation)."""
+    width, height, _ = probe_video_geometry(video_path)
+    return width, height
+
+def display_aspect(video_path, box=None):
+    """Displayed width / height of a crop box (x, y, w, h), or of the whole frame, SAR included."""
+    width, height, sar = probe_video_geometry(video_path)
+    if box is not None:
+        _, _, width, height = box
+    return float(width * sar / height)
+
+def center_crop_box(video_path, aspect):
+    """
+    Centered crop box (x, y, w, h) showing the given display aspect, trimming the
+    top and bottom of taller sources or the sides of wider ones. Returns None if
+    the frame already has that aspect.
+    """
+    width, height, sar = probe_video_geometry(video_path)
+    box_w, box_h = width & ~1, height & ~1
+    if width * sar / height > aspect:
+        box_w = int(height * aspect / sar) & ~1
+    else:
+        box_h = int(width * sar / aspect) & ~1
+    if (box_w, box_h) == (width & ~1, height & ~1):
+        return None
+    return ((width - box_w) // 2) & ~1, ((height - box_h) // 2) & ~1, box_w, box_h
+
+def sample_luma_frames(video_path, seek_time, duration, num_samples, width, height):
+    """
+    Decode num_samples frames spread evenly over [seek_time, seek_time + duration)
+    as 8-bit grayscale through one ffmpeg pipe.
+    Returns a (frames, height, width) uint8 array.
+    """
+    sample_fps = num_samples / float(duration)
+    command = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-ss", str(seek_time),
+        "-i", video_path,
+        "-t", str(duration),
+        "-vf", f"fps={sample_fps:.6f}",
+        "-frames:v", str(num_samples),
+        "-f", "rawvideo",
+        "-pix_fmt", "gray",
+        "pipe:1",
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    frame_size = width * height
+    num_frames = len(result.stdout) // frame_size
+    if num_frames == 0:
+        raise RuntimeError(f"ffmpeg returned no frames from {video_path}")
+    return np.frombuffer(result.stdout, dtype=np.uint8, count=num_frames * frame_size).reshape(num_frames, height, width)
+
+def content_span(maxima, threshold, min_fraction):
+    """
+    Given per-frame line maxima of shape (frames, lines), return (first, end) of the
+    lines that exceed 'threshold' in at least 'min_fraction' of the frames.
+    Returns None if no line qualifies.
+    """
+    active = (maxima > threshold).mean(axis=0) >= min_fraction
+    idx = np.flatnonzero(active)
+    if idx.size == 0:
+        return None
+    return int(idx[0]), int(idx[-1]) + 1
+
+def detect_crop_box(samples, threshold=24, min_fraction=0.1):
+    """
+    Find a stable crop box (x, y, w, h) over sampled luma frames. Edges are
+    shrunk inward to even coordinates so chroma-subsampled sources crop cleanly.
+    Returns None if the whole frame is picture (or the samples are all black).
+    """
+    num_frames, height, width = samples.shape
+    rows = content_span(samples.max(axis=2), threshold, min_fraction)
+    cols = content_span(samples.max(axis=1), threshold, min_fraction)
+    if rows is None or cols is None:
+        return None
+    top, bottom = rows
+    left, right = cols
+    top, left = (top + 1) & ~1, (left + 1) & ~1
+    bottom, right = bottom & ~1, right & ~1
+    if (left, top, right, bottom) == (0, 0, width & ~1, height & ~1):
+        return None
+    return left, top, right - left, bottom - top
+
+def crop_filter(box):
+    """ffmpeg filter string for a crop box from detect_crop_box."""
+    x, y, w, h = box
+    return f"crop={w}:{h}:{x}:{y}"
+
+def detect_letterbox(video_path, seek_time, duration, num_samples=24, threshold=24, min_fraction=0.1):
+    """
+    Sample the source and return its crop box (x, y, w, h), or None if no bars were found.
+    """
+    width, height = probe_video_size(video_path)
+    samples = sample_luma_frames(video_path, seek_time, duration, num_samples, width, height)
+    box = detect_crop_box(samples, threshold, min_fraction)
+    if box is None:
+        print(f"Letterbox detection: no bars found in {width}x{height} source ({len(samples)} samples)")
+    else:
+        x, y, w, h = box
+        print(f"Letterbox detection: {width}x{height} -> {w}x{h} at ({x},{y}) from {len(samples)} samples")
+    return box
+
+if __name__ == "__main__":
+    video_path = "/home/smith/Agon/mystuff/assets/video/staging/Star_Wars__Battle_of_Yavin.mp4"
+    box = detect_letterbox(video_path, "00:01:25", 120)
+    if box is not None:
+        print(crop_filter(box))
@@ -1,6 +1,14 @@
 import os
+import re
+import json
+import time
+import hashlib
+import collections
+import concurrent.futures
+import numpy as np
 from PIL import Image
 import agonutils as au
+from error_diffusion import load_gpl_palette, floyd_image
 
 def crop_images_fixed_size(img, target_width=1920, target_height=1280):
     """
@@ -79,64 +87,158 @@ def crop_images(img, target_aspect_ratio=(4, 3)):
 def scale_image(image, target_width, target_height):
     return image.resize((target_width, target_height), Image.BICUBIC)
 
-def process_images(staging_directory, processed_directory, palette_filepath, transparent_rgb, screen_width, screen_height, palette_conversion_method, agon_rgba_type):
+IMAGE_EXTENSIONS = ('.png', '.jpeg', '.jpg', '.gif')
+MANIFEST_FILENAME = '.make_images_manifest.json'
 
+def file_sha256(filepath, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-    os.makedirs(target_directory, exist_ok=True)
-    os.makedirs(processed_directory, exist_ok=True)
-
-    # Convert .jpeg, .jpg, and .gif files to .png
-    for input_image_filename in os.listdir(staging_directory):
-        input_image_path = os.path.join(staging_directory, input_image_filename)
-        if input_image_filename.endswith(('.jpeg', '.jpg', '.gif')):
-            # Load the image
-            img = Image.open(input_image_path)
+def load_manifest(manifest_path):
+    """Load the {input filename: {hash, params, output}} manifest, or an empty one."""
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-            # Convert to .png format and save with the same name but .png extension
-            png_filename = os.path.splitext(input_image_filename)[0] + '.png'
-            png_filepath = os.path.join(staging_directory, png_filename)
-            img.save(png_filepath, 'PNG')
+def save_manifest(manifest_path, manifest):
+    """Write the manifest atomically so an interrupted run never leaves it half-written."""
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
 
-            # Optionally, delete the original .jpeg, .jpg, or .gif file after conversion
-            os.remove(input_image_path)
+def output_stems(filenames):
+    """
+    Output base name for each input filename: its stem, unless another input has the
+    same stem (foo.jpg and foo.png; compared case-insensitively, as on the FAT SD card).
+    Those get their extension appended (foo_jpg, foo_png), then a counter if needed.
+    """
+    def key(stem):
+        return stem.lower()
 
-    # Now scan the directory again for all .png files and sort them
-    filenames = sorted([f for f in os.listdir(staging_directory) if f.endswith('.png')])
+    stems = [os.path.splitext(fn)[0] for fn in filenames]
+    counts = collections.Counter(key(stem) for stem in stems)
+    used = {key(stem) for stem in stems if counts[key(stem)] == 1}
+    result = {}
+    for fn, stem in zip(filenames, stems):
+        if counts[key(stem)] > 1:
+            ext = re.sub(r'[^a-zA-Z0-9]', '_', os.path.splitext(fn)[1].lstrip('.'))
+            candidate = f"{stem}_{ext}"
+            n = 2
+            while key(candidate) in used:
+                candidate = f"{stem}_{ext}_{n}"
+                n += 1
+            print(f"Output name clash: {fn} -> {candidate}")
+            stem = candidate
+        used.add(key(stem))
+        result[fn] = stem
+    return result
 
-    # Process the images
-    for input_image_filename in filenames:
-        input_image_path = os.path.join(staging_directory, input_image_filename)
+def convert_image(input_image_path, processed_image_path, output_path, palette_filepath, transparent_rgb,
+                  screen_width, screen_height, palette_conversion_method, agon_rgba_type, floyd_backend='agonutils'):
+    """
+    Worker: decode -> strip ICC -> crop -> scale -> quantize -> pack, all in memory.
+    Writes the palette-converted PNG to processed_image_path and the packed
+    .rgba2 (agon_rgba_type 1) or .rgba8 image to output_path.
+    With floyd_backend 'numpy', the 'floyd' method uses error_diffusion.floyd_image
+    (transparency from alpha only) instead of agonutils.
+    """
+    with Image.open(input_image_path) as img:
+        # Converting drops img.info, ICC profile included.
+        img = img.convert('RGBA')
+    img = crop_images(img)
+    scaled_img = scale_image(img, screen_width, screen_height)
 
-        # Continue only if it's a .png file
-        if input_image_filename.endswith('.png'):
-            # Open the image
-            img = Image.open(input_image_path)
+    rgba2 = None
+    if palette_conversion_method == 'floyd' and floyd_backend == 'numpy':
+        rgba = np.asarray(scaled_img, dtype=np.uint8)
+        converted, rgba2 = floyd_image(rgba, load_gpl_palette(palette_filepath))
+    else:
+        converted = au.convert_to_palette_bytes(
+            scaled_img.tobytes(), screen_width, screen_height, palette_filepath, palette_conversion_method, transparent_rgb
+        )
+    Image.frombytes('RGBA', (screen_width, screen_height), converted).save(processed_image_path)
 
-            # Remove ICC profile if present to avoid the warning
-            if "icc_profile" in img.info:
-                img.info.pop("icc_profile")
+    if agon_rgba_type == 1:
+        packed = rgba2 if rgba2 is not None else au.rgba32_to_rgba2_bytes(converted, screen_width, screen_height)
+    else:
+        packed = converted
+    with open(output_path, 'wb') as f:
+        f.write(packed)
+    return output_path
 
-            # Re-save the image to remove the incorrect ICC profile
-            img.save(input_image_path, 'PNG')
+def process_images(staging_directory, processed_directory, palette_filepath, transparent_rgb, screen_width, screen_height, palette_conversion_method, agon_rgba_type, jobs=None, floyd_backend='agonutils'):
+    """
+    Convert every .png/.jpeg/.jpg/.gif in staging_directory on a process pool.
+    Inputs whose content hash and conversion parameters match the manifest in
+    target_directory, and whose output still exists under the same name, are skipped,
+    so re-runs only process new or changed files. Inputs sharing a stem get distinct
+    output names (output_stems), so no two jobs write the same file. Originals are
+    left untouched.
+    """
+    os.makedirs(target_directory, exist_ok=True)
+    os.makedirs(processed_directory, exist_ok=True)
 
-        input_image_filepath = f'{staging_directory}/{input_image_filename}'
-        file_name, ext = os.path.splitext(input_image_filename)
-        output_image_filepath_png = f'{processed_directory}/{input_image_filename}'
+    manifest_path = os.path.join(target_directory, MANIFEST_FILENAME)
+    manifest = load_manifest(manifest_path)
+    params = f'{screen_width}x{screen_height}:{palette_conversion_method}:{agon_rgba_type}:{transparent_rgb}:{file_sha256(palette_filepath)}'
+    if palette_conversion_method == 'floyd':
+        params += f':{floyd_backend}'
+    extension = 'rgba2' if agon_rgba_type == 1 else 'rgba8'
 
-        with Image.open(input_image_filepath) as img:
-            # Crop the image to the target aspect ratio if needed
-            img = crop_images(img)
-            scaled_img = scale_image(img, screen_width, screen_height)
-            scaled_img.save(output_image_filepath_png)
+    filenames = sorted(f for f in os.listdir(staging_directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+    stems = output_stems(filenames)
+    pending = {}
+    for input_image_filename in filenames:
+        input_image_path = os.path.join(staging_directory, input_image_filename)
+        file_name = stems[input_image_filename]
+        output_path = f'{target_directory}/{file_name}.{extension}'
+        content_hash = file_sha256(input_image_path)
+        entry = manifest.get(input_image_filename)
+        if (entry and entry['hash'] == content_hash and entry['params'] == params
+                and entry.get('output') == output_path and os.path.exists(output_path)):
+            continue
+        pending[input_image_filename] = (input_image_path, f'{processed_directory}/{file_name}.png', output_path, content_hash)
 
-        au.convert_to_palette(output_image_filepath_png, output_image_filepath_png, palette_filepath, palette_conversion_method, transparent_rgb)
+    print(f"{len(filenames)} images, {len(filenames) - len(pending)} unchanged, {len(pending)} to convert")
+    start_time = time.time()
+    failed = 0
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(
+                    convert_image, input_image_path, processed_image_path, output_path, palette_filepath,
+                    transparent_rgb, screen_width, screen_height, palette_conversion_method, agon_rgba_type,
+                    floyd_backend
+                ): input_image_filename
+                for input_image_filename, (input_image_path, processed_image_path, output_path, _) in pending.items()
+            }
+            for n, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+                input_image_filename = futures[future]
+                try:
+                    output_path = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"\nError converting {input_image_filename}: {e}")
+                    continue
+                manifest[input_image_filename] = {
+                    'hash': pending[input_image_filename][3],
+                    'params': params,
+                    'output': output_path,
+                }
+                print(f"\r\033[KConverted {n}/{len(pending)}: {input_image_filename}", end="", flush=True)
+    finally:
+        save_manifest(manifest_path, manifest)
 
-        if agon_rgba_type == 1:
-            rgba_filepath = f'{target_directory}/{file_name}.rgba2'
-            au.img_to_rgba2(output_image_filepath_png, rgba_filepath)
-        else:
-            rgba_filepath = f'{target_directory}/{file_name}.rgba8'
-            au.img_to_rgba8(output_image_filepath_png, rgba_filepath)
+    elapsed = time.time() - start_time
+    rate = (len(pending) - failed) / elapsed if elapsed > 0 else 0.0
+    print(f"\nConverted {len(pending) - failed} images in {elapsed:.1f}s ({rate:.1f} images/s), {failed} failed")
 
 if __name__ == '__main__':
     staging_directory =         '/home/smith/Agon/mystuff/assets/images/staging'
@@ -148,5 +250,7 @@ if __name__ == '__main__':
     screen_height = 180
     palette_conversion_method = 'floyd'
     agon_rgba_type = 1  # RGBA2222
+    jobs = None  # worker processes; None = one per CPU
+    floyd_backend = 'agonutils'  # 'numpy' = error_diffusion.py's batched Floyd-Steinberg
 
-    process_images(staging_directory, processed_directory, palette_filepath, transparent_rgb, screen_width, screen_height, palette_conversion_method, agon_rgba_type)
+    process_images(staging_directory, processed_directory, palette_filepath, transparent_rgb, screen_width, screen_height, palette_conversion_method, agon_rgba_type, jobs, floyd_backend)
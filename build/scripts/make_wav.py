@@ -1,11 +1,31 @@
 import os
-import shutil
 import subprocess
 import re
 import json
-import shlex
+import time
+import argparse
+import tracemalloc
+import collections
+import concurrent.futures
 import soundfile as sf
 import numpy as np
+import media_probe
+import audio_dsp
+from agon_wav import fix_agon_wav_header, concat_agon_wavs
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac')
+MANIFEST_FILENAME = '.make_wav_manifest.json'
+
+ACOMPRESSOR_FILTER = 'acompressor=threshold=-20dB:ratio=3:attack=5:release=50:makeup=2.5'
+
+# Sample format ffmpeg holds each PCM codec's samples in (s24 is carried in s32).
+CODEC_SAMPLE_FMTS = {
+    'pcm_u8': 'u8',
+    'pcm_s16le': 's16',
+    'pcm_s24le': 's32',
+    'pcm_s32le': 's32',
+    'pcm_f32le': 'flt'
+}
 
 def compress_dynamic_range(input_path, output_path, codec):
     """
@@ -19,55 +39,122 @@ def compress_dynamic_range(input_path, output_path, codec):
         '-y',                                  # Overwrite output file
         '-i', input_path,                      # Input file
         '-ac', '1',                            # Ensure mono output
-        '-af', 'acompressor=threshold=-20dB:ratio=3:attack=5:release=50:makeup=2.5',
+        '-af', ACOMPRESSOR_FILTER,
         '-acodec', codec,                      # Preserve original codec
         output_path                            # Output file
     ], check=True)
 
-def normalize_audio(input_path, output_path):
+# soundfile subtype for writing each PCM codec.
+CODEC_SF_SUBTYPES = {
+    'pcm_u8': 'PCM_U8',
+    'pcm_s16le': 'PCM_16',
+    'pcm_s24le': 'PCM_24',
+    'pcm_s32le': 'PCM_32',
+    'pcm_f32le': 'FLOAT'
+}
+NORMALIZE_BLOCK_SIZE = 1 << 18
+
+def normalize_audio(input_path, output_path, codec=None, block_size=NORMALIZE_BLOCK_SIZE):
     """
     Remove DC offset & peak-normalize to 0 dBFS.
-    Reads any format supported by soundfile, writes 16-bit PCM WAV.
+    Reads any format supported by soundfile, writes 16-bit PCM WAV (or the
+    subtype matching codec, if given).
+
+    Two passes over soundfile.blocks keep memory constant whatever the length:
+      1) mean and extremes of the mono signal (summed in float64),
+      2) (x - mean) / peak, written block by block.
+    Output matches normalize_audio_in_memory within float rounding.
+    """
+    subtype = CODEC_SF_SUBTYPES.get(codec, 'PCM_16')
+
+    # 1) Mean and peak, block by block (multi-channel collapsed to mono by averaging)
+    count = 0
+    total = 0.0
+    lo, hi = np.inf, -np.inf
+    sr = sf.info(input_path).samplerate
+    for block in sf.blocks(input_path, blocksize=block_size, dtype='float32', always_2d=True):
+        mono = block.mean(axis=1)
+        count += mono.size
+        total += float(mono.sum(dtype=np.float64))
+        lo = min(lo, float(mono.min()))
+        hi = max(hi, float(mono.max()))
+    mean = np.float32(total / count) if count else np.float32(0.0)
+    peak = np.float32(max(hi - mean, mean - lo)) if count else np.float32(0.0)
+
+    # 2) Apply, writing to a temp file if reading and writing the same path
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    same_file = os.path.abspath(input_path) == os.path.abspath(output_path)
+    write_path = output_path + '.tmp.wav' if same_file else output_path
+    with sf.SoundFile(write_path, 'w', samplerate=sr, channels=1, subtype=subtype, format='WAV') as out:
+        for block in sf.blocks(input_path, blocksize=block_size, dtype='float32', always_2d=True):
+            data = block.mean(axis=1) - mean
+            if peak > 0:
+                data /= peak
+            out.write(data)
+    if same_file:
+        os.replace(write_path, output_path)
+
+def normalize_audio_in_memory(input_path, output_path):
+    """
+    The original whole-file normalize_audio, kept as the reference for
+    benchmark_normalize. Loads the entire file as float32.
     """
-    # 1) Load as float32 (range –1.0…+1.0)
     data, sr = sf.read(input_path, dtype='float32')
-    
-    # If multi-channel, collapse to mono by averaging
     if data.ndim > 1:
         data = data.mean(axis=1)
-    
-    # 2) Remove DC offset (center on 0.0)
     data = data - np.mean(data)
-    
-    # 3) Peak-normalize
     peak = np.max(np.abs(data))
     if peak > 0:
         data = data / peak
-    
-    # 4) Write out as 16-bit PCM WAV (you can change subtype as needed)
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
     sf.write(output_path, data, sr, subtype='PCM_16')
 
-def get_audio_metadata(file_path):
+def benchmark_normalize(work_dir, hours=3.0, sample_rate=44100, compare=True):
     """
-    Extracts metadata including sample rate and codec of the audio file using `ffprobe`.
+    Write a synthetic mono 16-bit test file of the given length (block by block),
+    normalize it blockwise and, if compare is set, also in memory. Prints time and
+    peak traced memory of each and the largest sample difference between them.
     """
-    result = subprocess.run([
-        'ffprobe',
-        '-hide_banner',
-        '-loglevel', 'error',
-        '-v', 'error',
-        '-select_streams', 'a:0',
-        '-show_entries', 'stream=sample_rate,sample_fmt',
-        '-of', 'json',
-        file_path
-    ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        check=True
-    )
-    metadata = json.loads(result.stdout)
+    os.makedirs(work_dir, exist_ok=True)
+    src = os.path.join(work_dir, 'normalize_bench_src.wav')
+    total = int(hours * 3600 * sample_rate)
+    rng = np.random.default_rng(0)
+    with sf.SoundFile(src, 'w', samplerate=sample_rate, channels=1, subtype='PCM_16') as f:
+        for start in range(0, total, sample_rate * 60):
+            n = min(sample_rate * 60, total - start)
+            t = np.arange(start, start + n) / sample_rate
+            f.write(0.4 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(n) + 0.02)
+
+    runs = [('blockwise', normalize_audio)]
+    if compare:
+        runs.append(('in-memory', normalize_audio_in_memory))
+    outputs = []
+    for name, func in runs:
+        out = os.path.join(work_dir, f'normalize_bench_{name}.wav')
+        tracemalloc.start()
+        start_time = time.time()
+        func(src, out)
+        elapsed = time.time() - start_time
+        _, peak_mem = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        outputs.append(out)
+        print(f"{name:>10}: {hours:.1f} h in {elapsed:.1f}s, peak memory {peak_mem / (1 << 20):.1f} MB")
+
+    if compare:
+        max_diff = 0
+        with sf.SoundFile(outputs[0]) as a, sf.SoundFile(outputs[1]) as b:
+            while True:
+                x = a.read(1 << 20, dtype='int16')
+                y = b.read(1 << 20, dtype='int16')
+                if not len(x):
+                    break
+                max_diff = max(max_diff, int(np.abs(x.astype(np.int32) - y).max()))
+        print(f"Largest difference: {max_diff} LSB (16-bit)")
+
+AUDIO_PROBE_ENTRIES = 'stream=sample_rate,sample_fmt'
+
+def audio_metadata_from_probe(metadata):
+    """(sample rate, codec) from ffprobe's stream=sample_rate,sample_fmt output."""
     sample_rate = int(metadata['streams'][0]['sample_rate'])
     sample_fmt = metadata['streams'][0]['sample_fmt']
     codec_map = {
@@ -78,9 +165,24 @@ def get_audio_metadata(file_path):
         'flt': 'pcm_f32le'
     }
     codec = codec_map.get(sample_fmt, 'pcm_s16le')  # Default to 16-bit PCM if unknown
+    return sample_rate, sample_fmt, codec
+
+def get_audio_metadata(file_path):
+    """
+    Extracts metadata including sample rate and codec of the audio file using `ffprobe`.
+    Results are cached by path, size and mtime (media_probe), so repeated queries
+    on an unchanged file do not run ffprobe again.
+    """
+    sample_rate, sample_fmt, codec = audio_metadata_from_probe(
+        media_probe.probe(file_path, AUDIO_PROBE_ENTRIES, 'a:0')
+    )
     print(f"Sample rate: {sample_rate} Hz, Format: {sample_fmt}, Codec: {codec}")
     return sample_rate, codec
 
+def prefetch_audio_metadata(paths, jobs=media_probe.DEFAULT_PROBE_JOBS):
+    """Probe many audio files concurrently, filling the cache get_audio_metadata reads."""
+    return media_probe.probe_many(paths, AUDIO_PROBE_ENTRIES, 'a:0', jobs)
+
 def convert_to_wav(input_path, output_path, codec):
     """
     Converts a file to `.wav` format while preserving the closest codec.
@@ -100,8 +202,12 @@ def convert_to_wav(input_path, output_path, codec):
 def resample_wav(input_path, output_path, sample_rate, codec):
     """
     Resamples the audio file to the specified sample rate.
+    Files soundfile can read are resampled in process (audio_dsp); others go through ffmpeg.
     """
     print("Resampling audio...")
+    if codec in CODEC_SF_SUBTYPES and audio_dsp.can_decode(input_path):
+        audio_dsp.resample_file(input_path, output_path, sample_rate, CODEC_SF_SUBTYPES[codec])
+        return
     subprocess.run([
         'ffmpeg',
         '-hide_banner',
@@ -114,11 +220,16 @@ def resample_wav(input_path, output_path, sample_rate, codec):
         output_path
     ], check=True)
 
-def convert_to_unsigned_pcm_wav(src_path, tgt_path, sample_rate):
+def convert_to_unsigned_pcm_wav(src_path, tgt_path, sample_rate, dither=False):
     """
     Converts an audio file directly to 8-bit unsigned PCM `.wav` file.
+    Files soundfile can read are resampled and quantized in process (audio_dsp),
+    with the Agon header written directly; others go through ffmpeg.
     """
     print("Converting to 8-bit unsigned PCM WAV...")
+    if audio_dsp.can_decode(src_path):
+        audio_dsp.resample_to_u8_wav(src_path, tgt_path, sample_rate, dither)
+        return
     subprocess.run([
         'ffmpeg',
         '-hide_banner',
@@ -133,92 +244,89 @@ def convert_to_unsigned_pcm_wav(src_path, tgt_path, sample_rate):
 
 def fix_wav_header_if_extensible(file_path):
     """
-    Reads a .wav file, checks if the fmt chunk is in WAVEFORMATEXTENSIBLE form,
-    and if so, rewrites it to a standard PCM (AudioFormat=1) with a fmt chunk
-    size of 16 bytes, removing the extra extension bytes.
-
-    NOTE:
-      - This assumes 'fmt ' is the first chunk after the WAVE header.
-      - It also assumes standard ordering and no unusual chunks
-        preceding 'fmt '.
+    Give file_path the canonical Agon 76-byte header (see agon_wav.py). Handles
+    WAVEFORMATEXTENSIBLE fmt chunks and any chunk order, patching the header in
+    place with seek/write unless the samples have to move to offset 76.
     """
+    result = fix_agon_wav_header(file_path)
+    if result != "ok":
+        print(f"Header {result} to the Agon layout for:", file_path)
 
-    with open(file_path, 'rb') as f:
-        data = f.read()
-
-    # Minimum size for a valid WAV with standard PCM header is 44 bytes.
-    if len(data) < 44:
-        print("Not a valid or too-short WAV file:", file_path)
-        return
-
-    # Check the RIFF and WAVE headers:
-    #   - "RIFF" at offset 0
-    #   - overall file size at offset 4
-    #   - "WAVE" at offset 8
-    if data[0:4] != b'RIFF' or data[8:12] != b'WAVE':
-        print("Not a standard RIFF/WAVE file:", file_path)
-        return
-
-    # The first chunk after "WAVE" normally starts at offset 12.
-    # We expect "fmt " at data[12:16], the chunk size at data[16:20].
-    if data[12:16] != b'fmt ':
-        print("Did not find 'fmt ' chunk where expected:", file_path)
-        return
-
-    fmt_chunk_size = int.from_bytes(data[16:20], byteorder='little')
-
-    # If fmt_chunk_size == 16, it's already standard PCM — do nothing.
-    if fmt_chunk_size == 16:
-        return
-
-    # For an extensible WAV, typically fmt_chunk_size is 40 (sometimes 18 or other).
-    # We'll forcibly convert to standard PCM (chunk_size=16, wFormatTag=1).
-    # The "extended" part begins right after the first 16 bytes of the fmt structure.
-
-    # Start of the 'fmt ' data is at offset 20.
-    # The standard 16-byte WAVEFORMATEX portion covers offsets 20..35 (inclusive).
-    # Then the extension is from offset (20+16) up to (20 + fmt_chunk_size).
-
-    extension_start = 20 + 16
-    extension_end = 20 + fmt_chunk_size
-
-    # Make a mutable copy of the entire file content.
-    new_data = bytearray(data)
-
-    # 1) Force AudioFormat to 1 (PCM) in bytes 20..21:
-    new_data[20:22] = (1).to_bytes(2, byteorder='little')
-
-    # 2) Remove the extra extension bytes from the file.
-    #    That means everything in new_data[extension_start:extension_end] goes away.
-    del new_data[extension_start:extension_end]
-
-    # 3) Set the fmt chunk size to 16 in offset 16..19:
-    new_data[16:20] = (16).to_bytes(4, byteorder='little')
-
-    # 4) Update the overall RIFF chunk size at offset 4..7:
-    #    new RIFF size = total length of the file (minus 8 bytes).
-    new_riff_size = len(new_data) - 8
-    new_data[4:8] = new_riff_size.to_bytes(4, byteorder='little')
-
-    # Write the modified file back.
-    with open(file_path, 'wb') as f:
-        f.write(new_data)
-
-    print("Converted WAVEFORMATEXTENSIBLE to standard PCM for:", file_path)
+def track_filter_chain(codec, source_rate, target_rate, do_compression, normalization=None):
+    """
+    The filters of the old multi-pass make_track as one -af chain. Each point where
+    a pass used to write an intermediate file becomes an aformat to that file's sample
+    format, so samples are quantized exactly where they were before:
+      mono in the source codec -> [acompressor] -> [DC removal and peak gain, 16-bit]
+      -> [aresample, source codec]. The final pcm_u8 conversion is the encoder's.
+    normalization is (mean, gain) from analyze_dc_and_peak, or None.
+    """
+    fmt = CODEC_SAMPLE_FMTS.get(codec, 's16')
+    chain = [f'aformat=sample_fmts={fmt}:channel_layouts=mono']
+    if do_compression:
+        chain += [ACOMPRESSOR_FILTER, f'aformat=sample_fmts={fmt}']
+    if normalization is not None:
+        mean, gain = normalization
+        chain += [f'aeval=(val(0)-({mean:.9g}))*{gain:.9g}:c=same', 'aformat=sample_fmts=s16']
+    if source_rate != target_rate:
+        chain += [f'aresample={target_rate}', f'aformat=sample_fmts={fmt}']
+    return chain
 
-def make_track(input_path, tgt_dir, sample_rate, do_compression, do_normalization):
+def analyze_dc_and_peak(input_path, filter_chain, block_size=1 << 20):
+    """
+    Analysis pass for peak normalization: decode input_path through filter_chain to
+    32-bit float on a pipe and return (mean, peak), where peak is the largest
+    |sample - mean|. Runs in constant memory.
+    """
+    process = subprocess.Popen([
+        'ffmpeg',
+        '-hide_banner',
+        '-loglevel', 'error',
+        '-i', input_path,
+        '-af', ','.join(filter_chain),
+        '-ac', '1',
+        '-f', 'f32le',
+        'pipe:1'
+    ], stdout=subprocess.PIPE)
+    count = 0
+    total = 0.0
+    lo, hi = np.inf, -np.inf
+    pending = b''
+    for block in iter(lambda: process.stdout.read(block_size), b''):
+        pending += block
+        usable = len(pending) // 4 * 4
+        samples = np.frombuffer(pending[:usable], dtype='<f4')
+        pending = pending[usable:]
+        if samples.size:
+            count += samples.size
+            total += float(samples.sum(dtype=np.float64))
+            lo = min(lo, float(samples.min()))
+            hi = max(hi, float(samples.max()))
+    process.stdout.close()
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, 'ffmpeg')
+    if count == 0:
+        return 0.0, 0.0
+    mean = total / count
+    return mean, max(hi - mean, mean - lo)
+
+def make_track(input_path, tgt_dir, sample_rate, do_compression, do_normalization, tgt_path=None):
     """
     Processes a single audio file at input_path and writes the result
-    (8-bit PCM .wav) to tgt_dir under the same base filename.
+    (8-bit PCM .wav) to tgt_path, by default tgt_dir under the same base filename.
+
+    All processing is one ffmpeg run with the chain from track_filter_chain. With
+    normalization a first, output-less analysis pass supplies the DC offset and
+    peak gain. Without normalization the chain quantizes at the same points as the old
+    convert/compress/resample/convert passes, so the output should match them byte
+    for byte. With normalization the gain is applied by ffmpeg rather than soundfile,
+    whose float to 16-bit scaling differs slightly, so samples may differ by one step.
     """
     os.makedirs(tgt_dir, exist_ok=True)
 
     # Build target paths
     filename_only = os.path.basename(input_path)
-    base, ext = os.path.splitext(filename_only)
-    safe_base = re.sub(r'[^a-zA-Z0-9]', '_', base)
-    tgt_path = os.path.join(tgt_dir, safe_base + '.wav')
-    temp_path = os.path.join(tgt_dir, "temp.wav")
+    tgt_path = tgt_path or track_output_path(input_path, tgt_dir)
 
     print(f"\nProcessing track: {filename_only}")
 
@@ -226,89 +334,196 @@ def make_track(input_path, tgt_dir, sample_rate, do_compression, do_normalizatio
     source_rate, codec = get_audio_metadata(input_path)
     target_rate = source_rate if sample_rate == -1 else sample_rate
 
-    # 1) Copy (or convert) to WAV if needed—always start from a WAV at tgt_path
-    if ext.lower() != '.wav':
-        convert_to_wav(input_path, temp_path, codec)
-        shutil.copy(temp_path, tgt_path)
-    else:
-        shutil.copy(input_path, tgt_path)
-    if os.path.exists(temp_path):
-        os.remove(temp_path)
-
-    # 2) Dynamic range compression (optional)
-    if do_compression:
-        shutil.copy(tgt_path, temp_path)
-        compress_dynamic_range(temp_path, tgt_path, codec)
-        os.remove(temp_path)
-
-    # 3) Peak normalization (optional)
+    # 1) Analysis pass for peak normalization (optional)
+    normalization = None
     if do_normalization:
-        shutil.copy(tgt_path, temp_path)
-        normalize_audio(temp_path, tgt_path)
-        os.remove(temp_path)
+        mean, peak = analyze_dc_and_peak(input_path, track_filter_chain(codec, source_rate, source_rate, do_compression))
+        normalization = (mean, 1.0 / peak if peak > 0 else 1.0)
+        print(f"Normalizing: DC offset {mean:.6f}, peak {peak:.6f}")
 
-    # 4) Resample if needed
-    if source_rate != target_rate:
-        shutil.copy(tgt_path, temp_path)
-        resample_wav(temp_path, tgt_path, target_rate, codec)
-        os.remove(temp_path)
-    else:
+    # 2) One pass: filters, resampling and 8-bit unsigned PCM output
+    chain = track_filter_chain(codec, source_rate, target_rate, do_compression, normalization)
+    if source_rate == target_rate:
         print("Skipping resampling (rates match)")
+    subprocess.run([
+        'ffmpeg',
+        '-hide_banner',
+        '-loglevel', 'error',
+        '-y',
+        '-i', input_path,
+        '-af', ','.join(chain),
+        '-ac', '1',
+        '-ar', str(target_rate),
+        '-acodec', 'pcm_u8',
+        tgt_path
+    ], check=True)
 
-    # 5) Convert to 8-bit unsigned PCM
-    shutil.copy(tgt_path, temp_path)
-    convert_to_unsigned_pcm_wav(temp_path, tgt_path, target_rate)
-    os.remove(temp_path)
-
-    # 6) Fix header if required
+    # 3) Fix header if required
     fix_wav_header_if_extensible(tgt_path)
 
     print(f"→ Finished: {tgt_path}")
+    return tgt_path
+
+def track_output_path(input_path, tgt_dir):
+    """Where make_track writes input_path: tgt_dir/<base name with non-alphanumerics as _>.wav"""
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(tgt_dir, re.sub(r'[^a-zA-Z0-9]', '_', base) + '.wav')
 
-def make_album(src_dir, tgt_dir, album_name, sample_rate):
+def assign_output_paths(tracks):
+    """
+    Output path for each (input_path, tgt_dir), as track_output_path, but unique:
+    sources that would share a target (a b.mp3 and a_b.flac, song.mp3 and song.wav;
+    compared case-insensitively, as on the FAT SD card) get their source extension
+    appended, then a counter if that still collides.
+    """
+    def key(path):
+        return os.path.normcase(path).lower()
+
+    plain = [track_output_path(input_path, tgt_dir) for input_path, tgt_dir in tracks]
+    counts = collections.Counter(key(path) for path in plain)
+    used = {key(path) for path in plain if counts[key(path)] == 1}
+    outputs = []
+    for (input_path, _), path in zip(tracks, plain):
+        if counts[key(path)] > 1:
+            stem = os.path.splitext(path)[0]
+            ext = re.sub(r'[^a-zA-Z0-9]', '_', os.path.splitext(input_path)[1].lstrip('.'))
+            candidate = f"{stem}_{ext}.wav"
+            n = 2
+            while key(candidate) in used:
+                candidate = f"{stem}_{ext}_{n}.wav"
+                n += 1
+            print(f"Output name clash: {input_path} -> {os.path.basename(candidate)}")
+            path = candidate
+        used.add(key(path))
+        outputs.append(path)
+    return outputs
+
+def load_manifest(manifest_path):
+    """Load the {source path: {mtime, size, params, output}} manifest, or an empty one."""
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest_path, manifest):
+    """Write the manifest atomically so an interrupted run never leaves it half-written."""
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+def convert_track_job(input_path, tgt_path, sample_rate, do_compression, do_normalization):
+    """Worker: make_track, then the converted track's duration in seconds."""
+    tgt_path = make_track(input_path, os.path.dirname(tgt_path), sample_rate, do_compression, do_normalization, tgt_path)
+    return tgt_path, sf.info(tgt_path).duration
+
+def convert_tracks(tracks, manifest_path, sample_rate, do_compression, do_normalization, jobs=None):
+    """
+    Convert (input_path, tgt_dir) pairs with make_track on a process pool.
+    A track is skipped if the manifest holds the same source mtime, size and
+    conversion parameters and output path, and its output still exists. Output
+    names are made unique first (assign_output_paths), so no two jobs write the same
+    file. Prints throughput as audio-seconds converted per wall-second and returns
+    the output paths in track order, with None for tracks that failed to convert.
+    """
+    manifest = load_manifest(manifest_path)
+    params = f'rate={sample_rate}:compression={do_compression}:normalization={do_normalization}'
+    outputs = assign_output_paths(tracks)
+    index_of = {}
+    pending = []
+    for i, ((input_path, _), tgt_path) in enumerate(zip(tracks, outputs)):
+        st = os.stat(input_path)
+        key = os.path.abspath(input_path)
+        index_of[key] = i
+        entry = manifest.get(key)
+        if (entry and entry['mtime'] == st.st_mtime and entry['size'] == st.st_size
+                and entry['params'] == params and entry.get('output') == tgt_path and os.path.exists(tgt_path)):
+            continue
+        pending.append((input_path, tgt_path, key, st))
+    if pending:
+        # One concurrent ffprobe pass over the changed tracks; workers read the saved cache.
+        prefetch_audio_metadata([input_path for input_path, _, _, _ in pending])
+
+    print(f"{len(tracks)} tracks, {len(tracks) - len(pending)} up to date, {len(pending)} to convert")
+    start_time = time.time()
+    audio_secs = 0.0
+    failed = 0
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(convert_track_job, input_path, tgt_path, sample_rate, do_compression, do_normalization):
+                    (input_path, key, st)
+                for input_path, tgt_path, key, st in pending
+            }
+            for future in concurrent.futures.as_completed(futures):
+                input_path, key, st = futures[future]
+                try:
+                    tgt_path, duration = future.result()
+                except Exception as e:
+                    failed += 1
+                    outputs[index_of[key]] = None
+                    manifest.pop(key, None)
+                    print(f"Error converting {input_path}: {e}")
+                    continue
+                audio_secs += duration
+                manifest[key] = {'mtime': st.st_mtime, 'size': st.st_size, 'params': params, 'output': tgt_path}
+    finally:
+        save_manifest(manifest_path, manifest)
+
+    elapsed = time.time() - start_time
+    rate = audio_secs / elapsed if elapsed > 0 else 0.0
+    print(f"Converted {len(pending) - failed} tracks ({audio_secs:.0f}s of audio) in {elapsed:.1f}s: "
+          f"{rate:.1f} audio-seconds per second, {failed} failed")
+    return outputs
+
+def sync_library(src_root, tgt_root, sample_rate, do_compression, do_normalization, jobs=None):
+    """
+    Mirror a source tree of audio files into tgt_root as 8-bit PCM .wav files,
+    converting only tracks that are new or changed since the last sync.
+    """
+    tracks = []
+    for dirpath, dirnames, filenames in os.walk(src_root):
+        dirnames.sort()
+        tgt_dir = os.path.normpath(os.path.join(tgt_root, os.path.relpath(dirpath, src_root)))
+        for fn in sorted(filenames):
+            if fn.lower().endswith(AUDIO_EXTENSIONS):
+                tracks.append((os.path.join(dirpath, fn), tgt_dir))
+    os.makedirs(tgt_root, exist_ok=True)
+    return convert_tracks(tracks, os.path.join(tgt_root, MANIFEST_FILENAME),
+                          sample_rate, do_compression, do_normalization, jobs)
+
+def make_album(src_dir, tgt_dir, album_name, sample_rate, jobs=None, chunk_align=False):
     os.makedirs(tgt_dir, exist_ok=True)
     output_path = os.path.join(tgt_dir, album_name + '.wav')
 
     # 1) Gather and sort input files
-    exts = ('.mp3', '.wav', '.flac')
     files = [
         os.path.join(src_dir, fn)
         for fn in sorted(os.listdir(src_dir))
-        if fn.lower().endswith(exts)
+        if fn.lower().endswith(AUDIO_EXTENSIONS)
     ]
     if not files:
         print(f"No audio files in {src_dir}")
         return
 
-    # 2) Process each track individually (to 8-bit PCM)
-    for input_path in files:
-        make_track(input_path, tgt_dir, sample_rate,
-                   do_compression=False, do_normalization=True)
-
-    # 3) Build concat list
-    list_file = os.path.join(tgt_dir, '__ffconcat.txt')
-    with open(list_file, 'w') as lf:
-        for input_path in files:
-            base = re.sub(r'[^a-zA-Z0-9]', '_',
-                          os.path.splitext(os.path.basename(input_path))[0])
-            processed_wav = os.path.join(tgt_dir, base + '.wav')
-            lf.write(f"file {shlex.quote(processed_wav)}\n")
-
-    # 4) Concatenate into one 8-bit PCM WAV
+    # 2) Process the tracks (to 8-bit PCM) in parallel, skipping up-to-date ones
+    processed = convert_tracks([(input_path, tgt_dir) for input_path in files],
+                               os.path.join(tgt_dir, MANIFEST_FILENAME), sample_rate,
+                               do_compression=False, do_normalization=True, jobs=jobs)
+    failed = [input_path for input_path, tgt_path in zip(files, processed) if tgt_path is None]
+    if failed:
+        # Never fill the gap with a stale output from an earlier run.
+        raise RuntimeError(f"Album {album_name} not created: {len(failed)} tracks failed to convert: "
+                           + ", ".join(os.path.basename(p) for p in failed))
+
+    # 3) Concatenate the 8-bit PCM payloads into one WAV, no re-encoding
     print(f"Creating album: {output_path}")
-    subprocess.run([
-        'ffmpeg',
-        '-hide_banner', '-loglevel', 'error',
-        '-y', '-f', 'concat', '-safe', '0',
-        '-i', list_file,
-        '-ac', '1',
-        '-ar', str(sample_rate),
-        '-acodec', 'pcm_u8',
-        output_path
-    ], check=True)
-
-    os.remove(list_file)
-    print("Album created successfully.")
+    start_time = time.time()
+    data_size = concat_agon_wavs(processed, output_path, sample_rate, chunk_align)
+    elapsed = time.time() - start_time
+    rate = data_size / elapsed / (1 << 20) if elapsed > 0 else 0.0
+    print(f"Album created successfully: {data_size} bytes in {elapsed:.2f}s ({rate:.0f} MB/s).")
 
 
 if __name__ == '__main__':
@@ -326,5 +541,17 @@ if __name__ == '__main__':
 
     do_compression = False
     do_normalization = True
-
-    make_album(src_dir, tgt_dir, album_name, sample_rate)
\ No newline at end of file
+    chunk_align = False  # pad each track to a multiple of sample_rate/60 bytes in the album
+
+    parser = argparse.ArgumentParser(description='Convert audio to 8-bit PCM .wav for the Agon.')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--sync', action='store_true',
+                        help='mirror the whole source tree incrementally instead of building an album')
+    parser.add_argument('--src', default=src_dir, help='source directory')
+    parser.add_argument('--tgt', default=tgt_dir, help='target directory')
+    args = parser.parse_args()
+
+    if args.sync:
+        sync_library(args.src, args.tgt, sample_rate, do_compression, do_normalization, args.jobs)
+    else:
+        make_album(args.src, args.tgt, album_name, sample_rate, args.jobs, chunk_align)
\ No newline at end of file
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Cached, concurrent ffprobe.
+
+Every probe result is stored under the file's absolute path and the query (the
+-select_streams / -show_entries arguments), together with the file's size and
+mtime. A lookup is served from memory if the file is unchanged, otherwise from the
+on-disk store (loaded once per process), and only then by running ffprobe. A file
+that is rewritten (e.g. normalized in place) gets a new size or mtime and is
+probed again. probe_many runs the misses of a whole library on a thread pool, so
+a rescan costs one ffprobe per changed file.
+
+The store is a small JSON file (PROBE_CACHE_PATH, or $AGON_PROBE_CACHE), written
+atomically after probe_many and at interpreter exit.
+"""
+import os
+import json
+import atexit
+import threading
+import subprocess
+import concurrent.futures
+
+PROBE_CACHE_PATH = os.environ.get(
+    "AGON_PROBE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "agon_ffprobe_cache.json")
+)
+DEFAULT_PROBE_JOBS = 8
+
+def file_signature(path):
+    """(size, mtime_ns) of a file; any change to either invalidates its cached probes."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def run_ffprobe(path, show_entries, select_streams=None):
+    """Run ffprobe for one file and return its parsed JSON output."""
+    command = ["ffprobe", "-hide_banner", "-v", "error"]
+    if select_streams:
+        command += ["-select_streams", select_streams]
+    command += ["-show_entries", show_entries, "-of", "json", path]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    return json.loads(result.stdout)
+
+class ProbeCache:
+    """
+    Memory + on-disk cache of ffprobe results.
+
+        cache = ProbeCache()
+        metadata = cache.probe(path, "stream=sample_rate,sample_fmt", "a:0")
+    """
+    def __init__(self, cache_path=PROBE_CACHE_PATH):
+        self.cache_path = cache_path
+        self.entries = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.cache_path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    @staticmethod
+    def _key(path, show_entries, select_streams):
+        return f"{os.path.abspath(path)}|{select_streams or ''}|{show_entries}"
+
+    def lookup(self, path, show_entries, select_streams=None):
+        """The cached result for an unchanged file, or None."""
+        size, mtime_ns = file_signature(path)
+        with self.lock:
+            entry = self._load().get(self._key(path, show_entries, select_streams))
+        if entry and entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+            return entry["metadata"]
+        return None
+
+    def store(self, path, show_entries, select_streams, signature, metadata):
+        size, mtime_ns = signature
+        with self.lock:
+            self._load()[self._key(path, show_entries, select_streams)] = {
+                "size": size, "mtime_ns": mtime_ns, "metadata": metadata
+            }
+            self.dirty = True
+
+    def probe(self, path, show_entries, select_streams=None):
+        """Probe one file, running ffprobe only on a cache miss."""
+        metadata = self.lookup(path, show_entries, select_streams)
+        if metadata is None:
+            signature = file_signature(path)
+            metadata = run_ffprobe(path, show_entries, select_streams)
+            self.store(path, show_entries, select_streams, signature, metadata)
+        return metadata
+
+    def probe_many(self, paths, show_entries, select_streams=None, jobs=DEFAULT_PROBE_JOBS):
+        """
+        Probe many files, the misses concurrently on a thread pool (ffprobe does the
+        work, so threads suffice). Returns {path: metadata}; files ffprobe fails on
+        map to None. The store is saved once at the end.
+        """
+        results = {}
+        misses = []
+        for path in paths:
+            metadata = self.lookup(path, show_entries, select_streams)
+            if metadata is None:
+                misses.append(path)
+            results[path] = metadata
+        if misses:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = {executor.submit(self.probe, path, show_entries, select_streams): path for path in misses}
+                for future in concurrent.futures.as_completed(futures):
+                    path = futures[future]
+                    try:
+                        results[path] = future.result()
+                    except (subprocess.CalledProcessError, ValueError, OSError) as e:
+                        print(f"Error probing {path}: {e}")
+            self.save()
+        print(f"Probed {len(paths)} files: {len(paths) - len(misses)} cached, {len(misses)} ran ffprobe")
+        return results
+
+    def save(self):
+        """Write the store atomically if anything was added since the last save."""
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.cache_path)
+            self.dirty = False
+
+default_cache = ProbeCache()
+atexit.register(default_cache.save)
+
+def probe(path, show_entries, select_streams=None):
+    """Probe one file through the shared cache."""
+    return default_cache.probe(path, show_entries, select_streams)
+
+def probe_many(paths, show_entries, select_streams=None, jobs=DEFAULT_PROBE_JOBS):
+    """Probe many files concurrently through the shared cache."""
+    return default_cache.probe_many(paths, show_entries, select_streams, jobs)
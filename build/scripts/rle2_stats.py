@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+RLE2 token statistics computed straight from raw RGBA2 frames.
+
+The rle2 CLI encodes each input file greedily:
+  - 14-byte header ("Cmpr", 4-byte uncompressed size, "RLE2", 2 bytes).
+  - A run of 3..130 identical pixels becomes 2 bytes: (run_length - 3), pixel.
+  - Anything shorter is written as 1-byte literals (pixel | 0x80).
+Longer runs are split into 130-pixel runs plus a remainder handled by the same rule.
+
+Given that, the exact token stream of every frame follows from its maximal runs, which
+NumPy can find for a whole clip at once. The analysis dicts produced here have the same
+shape as tests/rle2_histogram.py's parse_rle2_file (plus orig_size/comp_size), so they
+feed combine_analysis and write_csv_report unchanged.
+"""
+import numpy as np
+from frame_diff import diff_frames, open_frames
+
+RLE2_HEADER_SIZE = 14
+RLE2_MIN_RUN = 3
+RLE2_MAX_RUN = 130
+DEFAULT_CHUNK_FRAMES = 256
+
+def find_runs(frames):
+    """
+    Find the maximal runs of identical bytes in each row of a (num_frames, frame_size)
+    array. Runs never cross frame boundaries.
+    Returns (frame_idx, run_length, value) arrays, one entry per run, in stream order.
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    num_frames, frame_size = frames.shape
+    starts = np.ones(frames.shape, dtype=bool)
+    starts[:, 1:] = frames[:, 1:] != frames[:, :-1]
+    start_idx = np.flatnonzero(starts)
+    run_length = np.diff(np.append(start_idx, num_frames * frame_size))
+    return start_idx // frame_size, run_length, frames.reshape(-1)[start_idx]
+
+def rle2_token_stats(frames):
+    """
+    Compute per-frame RLE2 statistics for a stack of frames in one vectorized pass.
+    Returns a list of analysis dicts, one per frame, each with:
+      total_pixels, run_hist (run_length -> count, literals under key 1),
+      literals, runs, orig_size, comp_size (predicted rle2 output size incl. header).
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    num_frames, frame_size = frames.shape
+    frame_idx, run_length, _ = find_runs(frames)
+
+    # Greedy split: full 130-pixel runs, then a remainder that is a run if long enough.
+    full_runs = run_length // RLE2_MAX_RUN
+    remainder = run_length % RLE2_MAX_RUN
+    rem_is_run = remainder >= RLE2_MIN_RUN
+    literals = np.where(rem_is_run, 0, remainder)
+
+    literals_pf = np.bincount(frame_idx, weights=literals, minlength=num_frames).astype(np.int64)
+    runs_pf = np.bincount(frame_idx, weights=full_runs + rem_is_run, minlength=num_frames).astype(np.int64)
+    full_pf = np.bincount(frame_idx, weights=full_runs, minlength=num_frames).astype(np.int64)
+
+    # Histogram of remainder runs, keyed by (frame, length).
+    keys = frame_idx[rem_is_run] * (RLE2_MAX_RUN + 1) + remainder[rem_is_run]
+    uniq, counts = np.unique(keys, return_counts=True)
+    hist_frame = uniq // (RLE2_MAX_RUN + 1)
+    hist_len = uniq % (RLE2_MAX_RUN + 1)
+
+    analyses = []
+    for f in range(num_frames):
+        analyses.append({
+            "total_pixels": frame_size,
+            "run_hist": {},
+            "literals": int(literals_pf[f]),
+            "runs": int(runs_pf[f]),
+            "orig_size": frame_size,
+            "comp_size": RLE2_HEADER_SIZE + int(literals_pf[f]) + 2 * int(runs_pf[f]),
+        })
+    for f, length, count in zip(hist_frame.tolist(), hist_len.tolist(), counts.tolist()):
+        analyses[f]["run_hist"][length] = count
+    for f in range(num_frames):
+        hist = analyses[f]["run_hist"]
+        if full_pf[f]:
+            hist[RLE2_MAX_RUN] = hist.get(RLE2_MAX_RUN, 0) + int(full_pf[f])
+        if literals_pf[f]:
+            hist[1] = int(literals_pf[f])
+    return analyses
+
+def analyze_frames(frames, reference=None):
+    """
+    Analyze a stack of frames both as-is and diffed against their predecessors
+    ('reference' is the frame preceding frames[0], or None to store frame 0 raw).
+    Returns {"diffed": [...], "nondiffed": [...]} lists of per-frame analyses.
+    """
+    return {
+        "diffed": rle2_token_stats(diff_frames(frames, reference)),
+        "nondiffed": rle2_token_stats(frames),
+    }
+
+def analyze_frames_file(frames_path, frame_size, start_frame=0, num_frames=None,
+                        chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """
+    Memory-map a .frames file and analyze [start_frame : start_frame + num_frames],
+    processing 'chunk_frames' at a time. If start_frame > 0, the preceding frame is
+    used as the diff reference for the first analyzed frame.
+    """
+    frames = open_frames(frames_path, frame_size)
+    end_frame = frames.shape[0] if num_frames is None else min(frames.shape[0], start_frame + num_frames)
+    reference = frames[start_frame - 1] if start_frame > 0 else None
+    groups = {"diffed": [], "nondiffed": []}
+    for start in range(start_frame, end_frame, chunk_frames):
+        block = np.asarray(frames[start:min(start + chunk_frames, end_frame)])
+        chunk_groups = analyze_frames(block, reference)
+        groups["diffed"].extend(chunk_groups["diffed"])
+        groups["nondiffed"].extend(chunk_groups["nondiffed"])
+        reference = block[-1]
+    return groups
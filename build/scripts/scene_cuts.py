@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Scene-cut detection and per-second video budgets for RGBA2 clips.
+
+Two scores are computed between each frame and its predecessor, a whole chunk of a
+memory-mapped .frames file at a time:
+  - changed_fraction: share of pixels whose byte differs,
+  - hist_distance: half the L1 distance between the frames' 64-colour histograms (0..1).
+A cut needs both: a pan changes many pixels but keeps the histogram, while a fade keeps
+pixels similar from frame to frame. The cuts are used to
+  - place keyframes (make_agm writes a full frame unit, never a repeat or rectangle),
+  - reset temporal dither state (DitherStabilizer.reset),
+  - weight the per-second video budgets from allocate_video_budgets, which lends the
+    bytes quiet seconds leave unused to the busy seconds after them.
+"""
+import numpy as np
+from frame_diff import open_frames, previous_frames
+
+NUM_COLOURS = 64
+DEFAULT_CHUNK_FRAMES = 256
+CHANGED_THRESHOLD = 0.5
+HIST_THRESHOLD = 0.3
+MIN_CUT_GAP_SECS = 0.5
+CUT_WEIGHT = 2.0
+
+def colour_histograms(frames):
+    """64-bin histograms of the colour bits (0-5) of a (num_frames, frame_size) array."""
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    num_frames = frames.shape[0]
+    keys = (np.arange(num_frames)[:, np.newaxis] * NUM_COLOURS + (frames & 0x3F)).reshape(-1)
+    return np.bincount(keys, minlength=num_frames * NUM_COLOURS).reshape(num_frames, NUM_COLOURS)
+
+def frame_change_scores(frames, reference=None):
+    """
+    Scores of each frame against its predecessor ('reference' precedes frames[0];
+    with no reference frame 0 scores 1.0 on both). Returns (changed_fraction, hist_distance).
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    frame_size = frames.shape[1]
+    prev = previous_frames(frames, reference)
+    changed = (frames != prev).sum(axis=1) / float(frame_size)
+    hists = colour_histograms(frames)
+    prev_hists = colour_histograms(prev)
+    hist_distance = np.abs(hists - prev_hists).sum(axis=1) / (2.0 * frame_size)
+    if reference is None:
+        changed[0] = hist_distance[0] = 1.0
+    return changed, hist_distance
+
+def scan_frames_file(frames_path, frame_size, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """Score every frame of a .frames file, 'chunk_frames' at a time. Returns (changed, hist)."""
+    frames = open_frames(frames_path, frame_size)
+    changed = np.empty(frames.shape[0])
+    hist = np.empty(frames.shape[0])
+    reference = None
+    for start in range(0, frames.shape[0], chunk_frames):
+        block = np.asarray(frames[start:start + chunk_frames])
+        changed[start:start + len(block)], hist[start:start + len(block)] = frame_change_scores(block, reference)
+        reference = block[-1]
+    return changed, hist
+
+def detect_scene_cuts(changed, hist_distance, min_gap_frames=1,
+                      changed_threshold=CHANGED_THRESHOLD, hist_threshold=HIST_THRESHOLD):
+    """
+    Frame indices that start a new scene. Frame 0 is always a cut; candidates closer
+    than min_gap_frames to the previous cut are dropped (flashes, strobes).
+    """
+    candidates = np.flatnonzero((changed >= changed_threshold) & (hist_distance >= hist_threshold))
+    cuts = []
+    for idx in candidates.tolist():
+        if idx == 0 or not cuts or idx - cuts[-1] >= min_gap_frames:
+            cuts.append(idx)
+    if len(changed) and (not cuts or cuts[0] != 0):
+        cuts.insert(0, 0)
+    return cuts
+
+def detect_scene_cuts_file(frames_path, frame_size, frame_rate, **kwargs):
+    """Scan a .frames file and return (cuts, changed_fraction) for it."""
+    changed, hist = scan_frames_file(frames_path, frame_size)
+    cuts = detect_scene_cuts(changed, hist, max(1, int(MIN_CUT_GAP_SECS * frame_rate)), **kwargs)
+    print(f"Scene cuts: {len(cuts)} in {len(changed)} frames")
+    return cuts, changed
+
+class SceneCutDetector:
+    """
+    Frame-at-a-time detector for pipelines that produce frames one by one
+    (e.g. resetting dither state during extraction).
+    """
+    def __init__(self, min_gap_frames=1, changed_threshold=CHANGED_THRESHOLD, hist_threshold=HIST_THRESHOLD):
+        self.min_gap_frames = min_gap_frames
+        self.changed_threshold = changed_threshold
+        self.hist_threshold = hist_threshold
+        self.prev = None
+        self.since_cut = 0
+
+    def process(self, frame_bytes):
+        """True if this frame starts a new scene (the first frame always does)."""
+        frame = np.frombuffer(frame_bytes, dtype=np.uint8)
+        if self.prev is None or len(self.prev) != len(frame):
+            is_cut = True
+        else:
+            changed, hist = frame_change_scores(frame, self.prev)
+            is_cut = (changed[0] >= self.changed_threshold and hist[0] >= self.hist_threshold
+                      and self.since_cut >= self.min_gap_frames)
+        self.prev = frame.copy()
+        self.since_cut = 1 if is_cut else self.since_cut + 1
+        return is_cut
+
+def second_activity(changed, cuts, frame_rate, cut_weight=CUT_WEIGHT):
+    """
+    Per-second activity: mean changed fraction over the second's frames, plus cut_weight
+    for every cut in it (a cut frame has to be sent whole).
+    """
+    total_secs = -(-len(changed) // frame_rate)
+    secs = np.arange(len(changed)) // frame_rate
+    activity = np.bincount(secs, weights=changed, minlength=total_secs) / frame_rate
+    if len(cuts):
+        activity += cut_weight * np.bincount(np.asarray(cuts) // frame_rate, minlength=total_secs) / frame_rate
+    return activity
+
+def allocate_video_budgets(activity, bytes_per_sec, max_bank_secs=2.0):
+    """
+    Causal budget lending. Each second earns bytes_per_sec; a second's target is that
+    amount scaled by its activity relative to the clip mean. Seconds below target bank
+    the difference (up to max_bank_secs seconds' worth, the player's buffering headroom)
+    and busier seconds later on may spend it. Returns a list of per-second budgets.
+    """
+    activity = np.asarray(activity, dtype=np.float64)
+    mean = activity.mean() if len(activity) else 0.0
+    targets = bytes_per_sec * (activity / mean if mean > 0 else np.ones_like(activity))
+    max_bank = max_bank_secs * bytes_per_sec
+    bank = 0.0
+    budgets = []
+    for target in targets.tolist():
+        budget = min(target, bytes_per_sec + bank)
+        bank = min(bank + bytes_per_sec - budget, max_bank)
+        budgets.append(int(budget))
+    return budgets
+
+if __name__ == "__main__":
+    frames_path = "/home/smith/Agon/mystuff/assets/video/staging/Star_Wars__Battle_of_Yavin_bayer.frames"
+    width, height = 240, 104
+    frame_rate = 10
+    video_bytes_per_sec = 57600 - 15360
+
+    cuts, changed = detect_scene_cuts_file(frames_path, width * height, frame_rate)
+    budgets = allocate_video_budgets(second_activity(changed, cuts, frame_rate), video_bytes_per_sec)
+    for cut in cuts:
+        print(f"Cut at frame {cut} ({cut / float(frame_rate):.1f}s), budget {budgets[cut // frame_rate]} bytes")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Per-directory index files for the jukebox browser.
+
+On the device bf_get_dir (src/asm/browse.inc) reads every directory entry, opens
+each file to check its header (verify_wav / verify_agm in wav.inc, agm.inc) and
+sorts the survivors with selection_sort_asc_filinfo (sort.inc), O(n^2) compares on
+the eZ80. This script does all of that on the host: it walks a prepared SD-card tree
+and writes INDEX_FILENAME into every directory, holding the entries the browser
+would list, already in its order, so the player can load a directory in one read.
+
+Index layout (little-endian):
+     0  header, INDEX_HEADER_FMT (24 bytes):
+          magic "AGIX", version, flags (0), entry size, number of entries,
+          number of directories (they come first), 8-byte directory signature
+    24  entries, INDEX_ENTRY_FMT (28 bytes each):
+          type (ENTRY_DIR / ENTRY_WAV / ENTRY_AGM), flags (0), name length,
+          sample rate, duration in seconds, file size, data offset (first sample
+          or first segment), data size, name offset
+     .  names, zero-terminated, in entry order
+
+Order matches the player: directories before files (bf_get_dir tags them '0' and
+'1' ahead of the name), then names compared byte by byte (alpha_asc). Files are
+listed only if they pass the player's own checks: RIFF/WAVE, PCM mono, and
+"fmt" (.wav) or "agm" plus an AGNMOV version 1 header (.agm) at offset 12.
+Dot files, like the hidden and system files bf_get_dir skips, are left out.
+
+The signature hashes the names, sizes and mtimes of a directory's entries, so a
+rerun rewrites only the indexes of directories whose contents changed, reading no
+file headers elsewhere.
+"""
+import os
+import sys
+import struct
+import hashlib
+import argparse
+from agon_wav import AGON_WAV_HEADER_SIZE, validate_wav
+
+INDEX_FILENAME = "JUKEBOX.IDX"
+INDEX_MAGIC = b"AGIX"
+INDEX_VERSION = 1
+INDEX_HEADER_FMT = "<4sBBHHH8s4x"
+INDEX_ENTRY_FMT = "<BBHIIIIII"
+INDEX_HEADER_SIZE = struct.calcsize(INDEX_HEADER_FMT)
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY_FMT)
+
+ENTRY_DIR = 0
+ENTRY_WAV = 1  # same codes verify_wav returns in a
+ENTRY_AGM = 2
+
+AGM_HEADER_FMT = "<6sBHHBII48x"
+AGM_HEADER_SIZE = struct.calcsize(AGM_HEADER_FMT)
+MAX_PLAYER_ENTRIES = 255  # bf_get_dir sorts with an 8-bit count
+
+def probe_media(path, file_size):
+    """
+    Classify a file as the player would. Returns (type, sample_rate, duration_secs,
+    data_offset, data_size), or None if the player would not list it.
+    """
+    with open(path, "rb") as f:
+        header = f.read(AGON_WAV_HEADER_SIZE + AGM_HEADER_SIZE)
+    if len(header) < AGON_WAV_HEADER_SIZE or header[0:3] != b"RIF" or header[8:11] != b"WAV":
+        return None
+    if header[20:23] != b"\x01\x00\x01":  # PCM, mono
+        return None
+    sample_rate = struct.unpack_from("<I", header, 24)[0]
+
+    if header[12:15] == b"fmt":
+        try:
+            info = validate_wav(path)
+        except ValueError:
+            return None
+        # The player's check accepts any PCM mono WAV, so allow for 16-bit samples too.
+        bytes_per_sec = sample_rate * max(info["bits"] // 8, 1)
+        duration = info["data_size"] // bytes_per_sec if bytes_per_sec else 0
+        return ENTRY_WAV, sample_rate, duration, info["data_offset"], info["data_size"]
+
+    if header[12:15] == b"agm" and len(header) == AGON_WAV_HEADER_SIZE + AGM_HEADER_SIZE:
+        magic, version, _, _, _, _, audio_secs = struct.unpack_from(AGM_HEADER_FMT, header, AGON_WAV_HEADER_SIZE)
+        if magic != b"AGNMOV" or version != 1:
+            return None
+        data_offset = AGON_WAV_HEADER_SIZE + AGM_HEADER_SIZE
+        return ENTRY_AGM, sample_rate, audio_secs, data_offset, file_size - data_offset
+    return None
+
+def list_directory(dir_path):
+    """
+    (name, is_dir, size, mtime_ns) of every entry the index should consider,
+    in the player's order: directories first, then by the bytes of the name.
+    """
+    entries = []
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            if entry.name.startswith(".") or entry.name == INDEX_FILENAME:
+                continue
+            st = entry.stat()
+            entries.append((entry.name, entry.is_dir(), st.st_size, st.st_mtime_ns))
+    entries.sort(key=lambda e: (not e[1], os.fsencode(e[0])))
+    return entries
+
+def directory_signature(entries):
+    """8-byte hash of the listing; any added, removed or modified file changes it."""
+    h = hashlib.sha1()
+    for name, is_dir, size, mtime_ns in entries:
+        h.update(os.fsencode(name) + b"\0")
+        h.update(b"D" if is_dir else struct.pack("<QQ", size, mtime_ns))
+    return h.digest()[:8]
+
+def read_index_signature(index_path):
+    """Signature stored in an existing index, or None if it is missing or unreadable."""
+    try:
+        with open(index_path, "rb") as f:
+            header = f.read(INDEX_HEADER_SIZE)
+        magic, version, _, _, _, _, signature = struct.unpack(INDEX_HEADER_FMT, header)
+    except (OSError, struct.error):
+        return None
+    return signature if magic == INDEX_MAGIC and version == INDEX_VERSION else None
+
+def build_index(dir_path, entries, signature):
+    """The index bytes for a directory's (sorted) entries, and how many it lists."""
+    records = []
+    for name, is_dir, size, _ in entries:
+        if is_dir:
+            records.append((name, ENTRY_DIR, 0, 0, 0, 0, 0))
+            continue
+        media = probe_media(os.path.join(dir_path, name), size)
+        if media is not None:
+            entry_type, sample_rate, duration, data_offset, data_size = media
+            records.append((name, entry_type, sample_rate, duration, size, data_offset, data_size))
+
+    num_dirs = sum(1 for r in records if r[1] == ENTRY_DIR)
+    parts = [struct.pack(INDEX_HEADER_FMT, INDEX_MAGIC, INDEX_VERSION, 0, INDEX_ENTRY_SIZE,
+                         len(records), num_dirs, signature)]
+    names = []
+    name_offset = INDEX_HEADER_SIZE + len(records) * INDEX_ENTRY_SIZE
+    for name, entry_type, sample_rate, duration, size, data_offset, data_size in records:
+        name_bytes = os.fsencode(name)
+        parts.append(struct.pack(INDEX_ENTRY_FMT, entry_type, 0, len(name_bytes), sample_rate, duration,
+                                 size, data_offset, data_size, name_offset))
+        names.append(name_bytes + b"\0")
+        name_offset += len(name_bytes) + 1
+    return b"".join(parts + names), len(records)
+
+def index_directory(dir_path, force=False):
+    """
+    Write dir_path's index if its listing changed since the last one (or force).
+    Returns the number of entries written, or None if the index was up to date.
+    """
+    entries = list_directory(dir_path)
+    signature = directory_signature(entries)
+    index_path = os.path.join(dir_path, INDEX_FILENAME)
+    if not force and read_index_signature(index_path) == signature:
+        return None
+    data, count = build_index(dir_path, entries, signature)
+    if count > MAX_PLAYER_ENTRIES:
+        print(f"Warning: {dir_path} has {count} entries; the player lists at most {MAX_PLAYER_ENTRIES}")
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, index_path)
+    return count
+
+def index_tree(sd_root, force=False):
+    """Index every directory under sd_root, rewriting only those that changed."""
+    written = skipped = 0
+    for dirpath, dirnames, _ in os.walk(sd_root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        count = index_directory(dirpath, force)
+        if count is None:
+            skipped += 1
+        else:
+            written += 1
+            print(f"Indexed {dirpath}: {count} entries")
+    print(f"{written} indexes written, {skipped} up to date")
+    return written, skipped
+
+def read_index(index_path):
+    """Parse an index file back into a list of entry dicts (for checking and listing)."""
+    with open(index_path, "rb") as f:
+        data = f.read()
+    magic, version, _, entry_size, count, _, _ = struct.unpack_from(INDEX_HEADER_FMT, data, 0)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        raise ValueError(f"{index_path}: not a version {INDEX_VERSION} index")
+    entries = []
+    for i in range(count):
+        (entry_type, _, name_len, sample_rate, duration, size,
+         data_offset, data_size, name_offset) = struct.unpack_from(INDEX_ENTRY_FMT, data, INDEX_HEADER_SIZE + i * entry_size)
+        entries.append({
+            "name": os.fsdecode(data[name_offset:name_offset + name_len]),
+            "type": entry_type,
+            "sample_rate": sample_rate,
+            "duration": duration,
+            "size": size,
+            "data_offset": data_offset,
+            "data_size": data_size,
+        })
+    return entries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write jukebox directory indexes for an SD-card tree.")
+    parser.add_argument("sd_root", nargs="?", default="tgt")
+    parser.add_argument("--force", action="store_true", help="rewrite every index")
+    args = parser.parse_args()
+    if not os.path.isdir(args.sd_root):
+        sys.exit(f"{args.sd_root} is not a directory")
+    index_tree(args.sd_root, args.force)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Temporal dither stabilisation.
+
+Ordered or error-diffusion dithering re-rolls the noise pattern every frame, so pixels
+in static areas flicker between palette entries and diffed frames stay dense. Each
+frame is quantized twice, undithered and dithered; wherever the undithered pixel did
+not change, the previous frame's dithered pixel is reused, with a forced refresh
+after T consecutive unchanged frames so slow drifts still come through.
+"""
+import numpy as np
+
+def reuse_dithering_with_lookback(
+    oldNo:      bytes,
+    newNo:      bytes,
+    oldDither:  bytes,
+    newDither:  bytes,
+    unchanged_count: np.ndarray,
+    T: int
+) -> bytes:
+    """
+    Extended version of 'reuse dithering' that includes a "lookback" threshold T:
+      - If oldNo[i] == newNo[i], we increment unchanged_count[i].
+      - Otherwise, we reset unchanged_count[i] to 0.
+
+      Then, if unchanged_count[i] < T, do normal reuse:
+         final[i] = (unchanged? oldDither[i] : newDither[i])
+      Else (unchanged_count[i] >= T), we force adopting newDither[i].
+
+    All four input arrays are 8-bit palette data (same length).
+    'unchanged_count' is an integer array tracking consecutive unchanged frames.
+    Returns the final dithered frame as a 'bytes' object of length len(oldNo).
+    """
+    size = len(oldNo)
+    assert len(newNo) == size
+    assert len(oldDither) == size
+    assert len(newDither) == size
+    assert unchanged_count.shape[0] == size
+
+    # Convert the byte arrays to NumPy uint8 arrays (views).
+    arr_oldNo    = np.frombuffer(oldNo,    dtype=np.uint8)
+    arr_newNo    = np.frombuffer(newNo,    dtype=np.uint8)
+    arr_oldDith  = np.frombuffer(oldDither,dtype=np.uint8)
+    arr_newDith  = np.frombuffer(newDither,dtype=np.uint8)
+
+    final_arr = np.empty(size, dtype=np.uint8)
+
+    # 1) Check which pixels are 'unchanged' in no-dither sense
+    same_mask = (arr_oldNo == arr_newNo)
+
+    # 2) Update unchanged_count
+    unchanged_count[same_mask] += 1
+    unchanged_count[~same_mask] = 0
+
+    # 3) Reuse dithering logic with a forced refresh after T consecutive frames
+    #    (a) Start final_arr as a copy of oldDith
+    final_arr[:] = arr_oldDith
+
+    #    (b) For those pixels that have reached T => forcibly adopt newDither
+    force_mask = (unchanged_count >= T)
+    final_arr[force_mask] = arr_newDith[force_mask]
+
+    #    (c) For pixels below T but changed => newDither
+    changed_mask = (unchanged_count < T) & (~same_mask)
+    final_arr[changed_mask] = arr_newDith[changed_mask]
+
+    return final_arr.tobytes()
+
+class DitherStabilizer:
+    """
+    Carries the state reuse_dithering_with_lookback needs from frame to frame
+    (previous undithered frame, previous output frame, unchanged_count).
+    """
+    def __init__(self, lookback):
+        self.lookback = lookback
+        self.reset()
+
+    def reset(self):
+        """Forget all history; the next frame is taken as dithered (e.g. after a scene cut)."""
+        self.old_no = None
+        self.old_final = None
+        self.unchanged_count = None
+
+    def process(self, no_dither, dithered):
+        """
+        Take one frame quantized without and with dithering (RGBA2 bytes of equal
+        length) and return the stabilised dithered frame.
+        """
+        if self.old_no is None or len(self.old_no) != len(no_dither):
+            # First frame: nothing to reuse yet.
+            self.old_no = bytes(no_dither)
+            self.old_final = bytes(dithered)
+            self.unchanged_count = np.zeros(len(no_dither), dtype=np.uint16)
+            return self.old_final
+
+        final = reuse_dithering_with_lookback(
+            self.old_no, no_dither,
+            self.old_final, dithered,
+            self.unchanged_count, self.lookback
+        )
+        self.old_no = bytes(no_dither)
+        self.old_final = final
+        return final
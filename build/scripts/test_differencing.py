@@ -7,6 +7,8 @@ import numpy as np
 from PIL import Image
 
 import agonutils as au
+from frame_diff import compute_diff_frame
+from temporal_dither import reuse_dithering_with_lookback
 
 def parse_frame_index(filename):
     """
@@ -18,72 +20,12 @@ def parse_frame_index(filename):
         raise ValueError(f"Cannot parse frame index from '{filename}'")
     return int(m.group(1))
 
-def reuse_dithering_with_lookback(
-    oldNo:      bytes, 
-    newNo:      bytes,
-    oldDither:  bytes,
-    newDither:  bytes,
-    unchanged_count: np.ndarray,
-    T: int
-) -> bytes:
-    """
-    Extended version of 'reuse dithering' that includes a "lookback" threshold T:
-      - If oldNo[i] == newNo[i], we increment unchanged_count[i].
-      - Otherwise, we reset unchanged_count[i] to 0.
-
-      Then, if unchanged_count[i] < T, do normal reuse:
-         final[i] = (unchanged? oldDither[i] : newDither[i])
-      Else (unchanged_count[i] >= T), we force adopting newDither[i].
-
-    All four input arrays are 8-bit palette data (same length).
-    'unchanged_count' is an integer array tracking consecutive unchanged frames.
-    Returns the final dithered frame as a 'bytes' object of length len(oldNo).
-    """
-    size = len(oldNo)
-    assert len(newNo) == size
-    assert len(oldDither) == size
-    assert len(newDither) == size
-    assert unchanged_count.shape[0] == size
-
-    # Convert the byte arrays to NumPy uint8 arrays (views).
-    arr_oldNo    = np.frombuffer(oldNo,    dtype=np.uint8)
-    arr_newNo    = np.frombuffer(newNo,    dtype=np.uint8)
-    arr_oldDith  = np.frombuffer(oldDither,dtype=np.uint8)
-    arr_newDith  = np.frombuffer(newDither,dtype=np.uint8)
-
-    final_arr = np.empty(size, dtype=np.uint8)
-
-    # 1) Check which pixels are 'unchanged' in no-dither sense
-    same_mask = (arr_oldNo == arr_newNo)
-
-    # 2) Update unchanged_count
-    unchanged_count[same_mask] += 1
-    unchanged_count[~same_mask] = 0
-
-    # 3) Reuse dithering logic with a forced refresh after T consecutive frames
-    #    (a) Start final_arr as a copy of oldDith
-    final_arr[:] = arr_oldDith
-
-    #    (b) For those pixels that have reached T => forcibly adopt newDither
-    force_mask = (unchanged_count >= T)
-    final_arr[force_mask] = arr_newDith[force_mask]
-
-    #    (c) For pixels below T but changed => newDither
-    changed_mask = (unchanged_count < T) & (~same_mask)
-    final_arr[changed_mask] = arr_newDith[changed_mask]
-
-    return final_arr.tobytes()
-
 def compute_frame_difference(oldFinal: bytes, newFinal: bytes) -> bytes:
     """
     8-bit difference: 0 => unchanged, else new pixel index
     """
     assert len(oldFinal) == len(newFinal)
-    size = len(oldFinal)
-    diff = bytearray(size)
-    for i in range(size):
-        diff[i] = 0 if (oldFinal[i] == newFinal[i]) else newFinal[i]
-    return diff
+    return compute_diff_frame(oldFinal, newFinal)
 
 def dither_diff_test():
     """
@@ -1,10 +1,169 @@
 import os
+import csv
+import time
 import shutil
+import struct
+import argparse
 import subprocess
+import concurrent.futures
+from agon_wav import AgonWavWriter, WAVE_FORMAT_PCM, validate_wav, copy_range
 
-def trim_wav_files(src_dir, tgt_dir):
+# Containers whose audio ffmpeg can cut without re-encoding (-c copy).
+STREAM_COPY_EXTENSIONS = ('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac', '.mp4', '.mkv', '.webm')
+WAVE_FORMAT_IEEE_FLOAT = 3
+DEFAULT_CLIP_JOBS = 4
+
+def parse_time(value):
+    """Seconds from '90', '90.5', '1:30' or '0:01:30.5'; '' or None means None."""
+    if value is None or str(value).strip() == '':
+        return None
+    seconds = 0.0
+    for part in str(value).strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def load_clip_jobs(csv_path, tgt_dir):
+    """
+    Read clip jobs from a CSV with columns file, start, duration and an optional output
+    (a header row is optional). Relative source paths are relative to the CSV; outputs
+    go to tgt_dir, by default named <source stem>_<row>.<source extension>.
+    Returns a list of (src_path, tgt_path, start_secs, duration_secs or None).
+    """
+    base_dir = os.path.dirname(os.path.abspath(csv_path))
+    jobs = []
+    with open(csv_path, newline='') as f:
+        for row_num, row in enumerate(csv.reader(f), start=1):
+            row = [c.strip() for c in row]
+            if not row or not row[0] or row[0].startswith('#') or row[0].lower() == 'file':
+                continue
+            src_path = os.path.join(base_dir, row[0])
+            start = parse_time(row[1] if len(row) > 1 else None) or 0.0
+            duration = parse_time(row[2] if len(row) > 2 else None)
+            stem, ext = os.path.splitext(os.path.basename(src_path))
+            output = row[3] if len(row) > 3 and row[3] else f"{stem}_{row_num:03d}{ext}"
+            jobs.append((src_path, os.path.join(tgt_dir, output), start, duration))
+    return jobs
+
+def build_pcm_wav_header(audio_format, channels, sample_rate, bits, data_size):
+    """Plain 44-byte RIFF/WAVE header (fmt then data) for PCM or float samples."""
+    block_align = channels * bits // 8
+    return b"".join([
+        b"RIFF", struct.pack("<I", 36 + data_size + (data_size & 1)), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, audio_format, channels, sample_rate, sample_rate * block_align, block_align, bits),
+        b"data", struct.pack("<I", data_size),
+    ])
+
+def clip_wav(src_path, tgt_path, start, duration):
+    """
+    Sample-exact WAV clip without ffmpeg: the byte range of the wanted sample frames is
+    copied behind a rewritten header (the canonical Agon header for 8-bit mono PCM).
+    Returns the clip length in seconds, or None if the WAV holds compressed audio.
+    """
+    info = validate_wav(src_path)
+    if info['audio_format'] not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT) or info['bits'] % 8:
+        return None
+    rate = info['sample_rate']
+    block_align = info['channels'] * info['bits'] // 8
+    total_frames = info['data_size'] // block_align
+    first = min(int(round(start * rate)), total_frames)
+    count = total_frames - first if duration is None else min(int(round(duration * rate)), total_frames - first)
+    offset, size = info['data_offset'] + first * block_align, count * block_align
+
+    with open(src_path, 'rb') as src:
+        if info['audio_format'] == WAVE_FORMAT_PCM and info['channels'] == 1 and info['bits'] == 8:
+            with AgonWavWriter(tgt_path, rate) as writer:
+                writer.copy_from(src, offset, size)
+        else:
+            with open(tgt_path, 'wb') as dst:
+                dst.write(build_pcm_wav_header(info['audio_format'], info['channels'], rate, info['bits'], size))
+                copy_range(src, dst, offset, size)
+                if size & 1:
+                    dst.write(b"\0")
+    return count / float(rate)
+
+def clip_ffmpeg(src_path, tgt_path, start, duration, stream_copy=True):
+    """Cut with ffmpeg, by stream copy if asked (fast, cuts at the codec's frame boundaries)."""
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-ss', str(start), '-i', src_path]
+    if duration is not None:
+        command += ['-t', str(duration)]
+    if stream_copy:
+        command += ['-c', 'copy']
+    command += [tgt_path]
+    subprocess.run(command, check=True)
+
+def clip_job(src_path, tgt_path, start, duration):
     """
-    Trims the first 10 seconds of .wav files in the source directory
+    Worker: run one clip job by the cheapest method the source allows.
+    Returns a dict with src, tgt, method, seconds (clip length, if known), bytes and elapsed.
+    """
+    start_time = time.time()
+    os.makedirs(os.path.dirname(tgt_path) or '.', exist_ok=True)
+    ext = os.path.splitext(src_path)[1].lower()
+    seconds = None
+    method = None
+    if ext == '.wav':
+        try:
+            seconds = clip_wav(src_path, tgt_path, start, duration)
+            method = 'wav-copy' if seconds is not None else None
+        except ValueError:
+            method = None  # not a readable RIFF/WAVE after all; let ffmpeg try
+    if method is None and ext in STREAM_COPY_EXTENSIONS:
+        try:
+            clip_ffmpeg(src_path, tgt_path, start, duration, stream_copy=True)
+            method = 'stream-copy'
+        except subprocess.CalledProcessError:
+            method = None
+    if method is None:
+        clip_ffmpeg(src_path, tgt_path, start, duration, stream_copy=False)
+        method = 're-encode'
+    if seconds is None and duration is not None:
+        seconds = duration
+    return {
+        'src': src_path,
+        'tgt': tgt_path,
+        'method': method,
+        'seconds': seconds,
+        'bytes': os.path.getsize(tgt_path),
+        'elapsed': time.time() - start_time,
+    }
+
+def run_clip_jobs(jobs, max_workers=DEFAULT_CLIP_JOBS):
+    """
+    Run (src_path, tgt_path, start, duration) jobs on a bounded thread pool (the work is
+    file I/O and ffmpeg processes). Prints each job's timing as it finishes and the
+    overall throughput. Returns the results of the jobs that succeeded.
+    """
+    results = []
+    failed = 0
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(clip_job, *job): job for job in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            src_path = futures[future][0]
+            try:
+                result = future.result()
+            except (subprocess.CalledProcessError, OSError, ValueError) as e:
+                failed += 1
+                print(f"Error clipping {src_path}: {e}")
+                continue
+            results.append(result)
+            length = f"{result['seconds']:.2f}s" if result['seconds'] is not None else "to end"
+            print(f"{result['method']:>11}  {result['elapsed'] * 1000:7.1f} ms  {length:>9}  "
+                  f"{result['bytes']:>10} B  {os.path.basename(result['tgt'])}")
+
+    elapsed = time.time() - start_time
+    total_secs = sum(r['seconds'] or 0.0 for r in results)
+    total_bytes = sum(r['bytes'] for r in results)
+    methods = {m: sum(1 for r in results if r['method'] == m) for m in ('wav-copy', 'stream-copy', 're-encode')}
+    print(f"{len(results)} clips ({', '.join(f'{n} {m}' for m, n in methods.items() if n)}), {failed} failed, "
+          f"in {elapsed:.2f}s: {len(results) / elapsed if elapsed > 0 else 0.0:.1f} clips/s, "
+          f"{total_secs / elapsed if elapsed > 0 else 0.0:.1f} audio-seconds/s, "
+          f"{total_bytes / (1 << 20) / elapsed if elapsed > 0 else 0.0:.1f} MB/s")
+    return results
+
+def trim_wav_files(src_dir, tgt_dir, duration=10, max_workers=DEFAULT_CLIP_JOBS):
+    """
+    Trims the first 'duration' seconds of .wav and .mp3 files in the source directory
     and saves them to the target directory.
     """
 
@@ -13,30 +172,25 @@ def trim_wav_files(src_dir, tgt_dir):
         shutil.rmtree(tgt_dir)
     os.makedirs(tgt_dir)
 
-    trimmed_files = []
-    for filename in sorted(os.listdir(src_dir)):
-        if filename.endswith('.wav') or filename.endswith('.mp3'):
-            src_path = os.path.join(src_dir, filename)
-            tgt_path = os.path.join(tgt_dir, filename)
-
-            # Construct the ffmpeg command for trimming the first 10 seconds
-            command = [
-                'ffmpeg',
-                '-i', src_path,              # Input file
-                '-t', '10',                  # Duration (first 10 seconds)
-                '-c', 'copy',                # Copy codec to avoid re-encoding
-                tgt_path                     # Output file
-            ]
-
-            # Execute the command
-            subprocess.run(command, check=True)
-
-            # Save metadata for the trimmed file
-            size = os.path.getsize(tgt_path)
-            trimmed_files.append((filename, size))
+    jobs = [
+        (os.path.join(src_dir, filename), os.path.join(tgt_dir, filename), 0.0, duration)
+        for filename in sorted(os.listdir(src_dir))
+        if filename.endswith('.wav') or filename.endswith('.mp3')
+    ]
+    results = run_clip_jobs(jobs, max_workers)
+    return [(os.path.basename(r['tgt']), r['bytes']) for r in results]
 
 
 if __name__ == '__main__':
-    src_dir = '/home/smith/Agon/mystuff/assets/sound/music/staging'
-    tgt_dir = '/home/smith/Agon/mystuff/assets/sound/music/processed'
-    trim_wav_files(src_dir, tgt_dir)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clip audio files in parallel.")
+    parser.add_argument('csv', nargs='?', help="CSV of file,start,duration[,output] jobs; without it, trim src_dir")
+    parser.add_argument('--tgt', default='/home/smith/Agon/mystuff/assets/sound/music/processed')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_CLIP_JOBS, help="worker threads")
+    args = parser.parse_args()
+
+    if args.csv:
+        os.makedirs(args.tgt, exist_ok=True)
+        run_clip_jobs(load_clip_jobs(args.csv, args.tgt), args.jobs)
+    else:
+        src_dir = '/home/smith/Agon/mystuff/assets/sound/music/staging'
+        trim_wav_files(src_dir, args.tgt, max_workers=args.jobs)
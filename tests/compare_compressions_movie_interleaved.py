@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 import os
 import re
+import sys
 import csv
 import subprocess
 import math
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build", "scripts"))
+from frame_diff import compute_diff_frame
+from interleave import interleave_frames
+
 ### Helper Compression Functions ###
 def get_file_size(path):
     return os.path.getsize(path)
@@ -87,21 +92,7 @@ def compare_frames(prev_frame, curr_frame):
     output the current byte; otherwise output 0.
     Returns a new bytes object.
     """
-    return bytes((curr if curr != prev else 0) for prev, curr in zip(prev_frame, curr_frame))
-
-def interleave_frames(frames):
-    """
-    Given a list of bytes objects (frames), return a new bytes object with the data interleaved.
-    Assumes all frames have the same length.
-    """
-    if not frames:
-        return b""
-    frame_len = len(frames[0])
-    interleaved = bytearray()
-    for i in range(frame_len):
-        for frame in frames:
-            interleaved.append(frame[i])
-    return bytes(interleaved)
+    return compute_diff_frame(prev_frame, curr_frame)
 
 def sequential_concat(frames):
     """
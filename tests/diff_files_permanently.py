@@ -1,23 +1,15 @@
 #!/usr/bin/env python3
 import os
+import sys
 import glob
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build", "scripts"))
+from frame_diff import compute_diff_frame
+
 # --- Configuration ---
 SOURCE_DIR = "/home/smith/Agon/mystuff/assets/video/frames/"
 TARGET_DIR = "/home/smith/Agon/mystuff/assets/video/diffs_RGB_bayer/"
 
-# --- Diffing function ---
-def compute_diff_frame(prev_frame, curr_frame):
-    """
-    Computes a difference frame:
-      - If prev_frame is None, returns curr_frame (first frame stored raw).
-      - Otherwise, outputs the current pixel value if it differs from the previous frame,
-        otherwise outputs 0.
-    """
-    if prev_frame is None:
-        return curr_frame
-    return bytes(curr if curr != prev else 0 for prev, curr in zip(prev_frame, curr_frame))
-
 def clear_target_directory(directory):
     """Deletes all files in the target directory before writing new ones."""
     if not os.path.exists(directory):
@@ -3,6 +3,9 @@ import os
 import re
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build", "scripts"))
+from interleave import interleave_frames
+
 ### Helper Functions ###
 def load_sorted_frames(directory):
     """
@@ -24,20 +27,6 @@ def sequential_concat(frames):
     """Concatenate a list of frames in order."""
     return b"".join(frames)
 
-def interleave_frames(frames):
-    """
-    Given a list of frames (as bytes), interleave them byte-by-byte.
-    Assumes all frames have equal length.
-    """
-    if not frames:
-        return b""
-    frame_len = len(frames[0])
-    interleaved = bytearray()
-    for i in range(frame_len):
-        for frame in frames:
-            interleaved.append(frame[i])
-    return bytes(interleaved)
-
 def main():
     global raw_frames_dir, diffed_frames_dir, START_SECOND, ORIGINAL_FRAME_RATE, TARGET_FRAME_RATE
 
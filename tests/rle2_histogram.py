@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import sys
 import glob
 import csv
 import subprocess
@@ -7,22 +8,16 @@ from collections import defaultdict
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build", "scripts"))
+from frame_diff import compute_diff_frame
+from rle2_stats import analyze_frames, analyze_frames_file
+import numpy as np
+
 # Constants
 HEADER_SIZE = 14
 TEMP_RLE_FILE = "temp_rle2.rle2"
 TEMP_DIFF_FILE = "temp_diff.rgba2"
 
-def compute_diff_frame(prev_frame, curr_frame):
-    """
-    Computes a difference frame:
-      - If prev_frame is None, returns curr_frame (first frame stored raw).
-      - Otherwise, outputs the current pixel value if it differs from the previous frame,
-        otherwise outputs 0.
-    """
-    if prev_frame is None:
-        return curr_frame
-    return bytes(curr if curr != prev else 0 for prev, curr in zip(prev_frame, curr_frame))
-
 def compress_to_rle2(input_file, output_file):
     """
     Compresses an .rgba2 file to an .rle2 file using the `rle2 -c` command.
@@ -206,11 +201,35 @@ def analyze_directory(directory, start_frame, num_frames):
 
     return groups
 
+def analyze_directory_vectorized(directory, start_frame, num_frames):
+    """
+    Same result as analyze_directory, but computes the RLE2 token statistics
+    directly from the raw frames (see rle2_stats) instead of running rle2 on each one.
+    """
+    all_files = load_sorted_files(directory)
+    print(f"Analyzing frames in {directory}")
+
+    if start_frame >= len(all_files):
+        print("Error: start_frame is beyond the number of available files.")
+        return {"diffed": [], "nondiffed": []}
+
+    first = max(start_frame - 1, 0)
+    files = all_files[first : start_frame + num_frames]
+    frames = np.stack([np.fromfile(fn, dtype=np.uint8) for fn in files])
+    if start_frame > 0:
+        return analyze_frames(frames[1:], reference=frames[0])
+    return analyze_frames(frames)
+
 def main():
     global output_csv
 
     # Run analysis and generate CSV data
-    groups = analyze_directory(frames_dir, start_frame, num_frames)
+    if frames_file:
+        groups = analyze_frames_file(frames_file, frame_size, start_frame, num_frames)
+    elif use_rle2_cli:
+        groups = analyze_directory(frames_dir, start_frame, num_frames)
+    else:
+        groups = analyze_directory_vectorized(frames_dir, start_frame, num_frames)
     write_csv_report(groups, output_csv)
     print(f"Histogram written to {output_csv}")
 
@@ -268,6 +287,12 @@ if __name__ == "__main__":
     start_frame = 1
     num_frames = 1799
 
+    # Set frames_file (and frame_size) to analyze a whole .frames clip instead of frames_dir.
+    frames_file = None
+    frame_size = 240 * 104
+    # Set True to compress every frame with the rle2 CLI instead of predicting its output.
+    use_rle2_cli = False
+
     # Make output filename dynamic
     output_csv = f"frames/rle2_histogram_start{start_frame}_count{num_frames}.csv"
     os.makedirs(os.path.dirname(output_csv), exist_ok=True)